@@ -0,0 +1,282 @@
+# benchmark_producer.py
+"""음악 스트리밍 시뮬레이터 핫 패스 벤치마크
+
+사용자 수·카탈로그 배율 조합마다 별도 프로세스에서 시뮬레이터를 만들고
+생성 단계별 처리량, 백필 기준 종단 간 초당 이벤트 수, 최대 RSS, 시작 시간을 측정해
+JSON 파일로 저장한다. Kafka는 프로세스 안의 가짜 프로듀서로 대체하므로 브로커 없이 실행된다.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from kafka.partitioner.default import murmur2
+
+from music_streaming_producer_realistic import (
+    PAGES, BinaryEventEncoder, FileSink, KafkaSink, RealisticMusicStreamingSimulator
+)
+
+# 백필 종단 간 측정 구간 (평일 저녁 피크 시간대)
+BACKFILL_START = datetime(2024, 3, 4, 19, 0)
+
+
+class FakeFuture:
+    """kafka-python FutureRecordMetadata처럼 콜백을 받았다가 배치 전송 시 호출"""
+
+    __slots__ = ('callbacks', 'done')
+
+    def __init__(self):
+        self.callbacks = []
+        self.done = False
+
+    def add_callback(self, fn, *args):
+        # 이미 전송된 future면 실제 프로듀서처럼 바로 호출
+        if self.done:
+            fn(*args, None)
+        else:
+            self.callbacks.append((fn, args))
+        return self
+
+    def complete(self):
+        self.done = True
+        for fn, args in self.callbacks:
+            fn(*args, None)
+
+    def add_errback(self, fn, *args):
+        return self
+
+
+class FakeKafkaProducer:
+    """프로세스 안에서 동작하는 가짜 Kafka 프로듀서
+
+    실제 프로듀서처럼 키를 murmur2로 파티셔닝하고 파티션별 배치에 바이트를 모으며,
+    batch_records개가 쌓이거나 flush할 때 배치를 '전송'하고 전송 완료 콜백을 호출한다.
+    네트워크 I/O만 빠진 프로듀서 쪽 CPU 비용과 KafkaSink의 콜백·역압 경로를 함께 측정한다.
+    """
+
+    def __init__(self, num_partitions=12, batch_records=1000):
+        self.num_partitions = num_partitions
+        self.batch_records = batch_records
+        self.pending = []
+        self.partition_bytes = [0] * num_partitions
+        self.records = 0
+
+    def send(self, topic, key=None, value=None):
+        partition = (murmur2(key) & 0x7fffffff) % self.num_partitions
+        self.partition_bytes[partition] += len(key) + len(value)
+        self.records += 1
+        future = FakeFuture()
+        self.pending.append(future)
+        if len(self.pending) >= self.batch_records:
+            self.flush()
+        return future
+
+    def flush(self, timeout=None):
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.complete()
+
+    def close(self, timeout=None):
+        self.flush()
+
+
+def _measure(fn, calls, min_seconds):
+    """calls(인자 튜플 목록)를 min_seconds 이상 반복 호출하고 처리량 반환"""
+    count = 0
+    started = time.perf_counter()
+    while True:
+        for args in calls:
+            fn(*args)
+        count += len(calls)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+    return {'calls': count, 'seconds': round(elapsed, 6), 'per_second': round(count / elapsed, 1)}
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - started, 6)
+
+
+def _attach_sinks(simulator, directory, name):
+    """시뮬레이터에 가짜 Kafka 싱크와 임시 디렉터리의 파일 싱크 연결"""
+    simulator.kafka_sink = KafkaSink(None, 'benchmark', producer=FakeKafkaProducer())
+    simulator.file_sink = FileSink(os.path.join(directory, f'{name}.json'))
+
+
+def run_case(num_users, catalog_scale, seed, min_seconds, backfill_minutes):
+    """한 조합 측정 (별도 프로세스에서 실행해 최대 RSS가 조합별로 나오게 함)"""
+    result = {'users': num_users, 'catalog_scale': catalog_scale}
+    benchmarks = result['benchmarks'] = {}
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            tempfile.TemporaryDirectory(prefix='music-bench-') as directory:
+        simulator, result['startup_seconds'] = _timed(lambda: RealisticMusicStreamingSimulator(
+            num_users=num_users, seed=seed, catalog_scale=catalog_scale))
+        result['songs'] = len(simulator.songs)
+        result['artists'] = len(simulator.artists)
+
+        # 월드 생성 단계 (생성자 안에서 한 번 실행된 것과 같은 작업을 다시 측정)
+        _, benchmarks['generate_massive_song_database_seconds'] = _timed(simulator._generate_massive_song_database)
+        _, benchmarks['generate_users_seconds'] = _timed(simulator._generate_users)
+
+        now = BACKFILL_START
+        users = simulator.users[:1000]
+        user_calls = [(user,) for user in users]
+        benchmarks['select_song_intelligently'] = _measure(
+            simulator._select_song_intelligently, user_calls, min_seconds)
+        benchmarks['get_next_action'] = _measure(
+            simulator._get_next_action, [(page,) for page in PAGES] * 100, min_seconds)
+        benchmarks['should_generate_event'] = _measure(
+            simulator._should_generate_event, [(now, user) for user in users], min_seconds)
+        benchmarks['generate_event'] = _measure(
+            simulator._generate_event, [(user, i + 1, now) for i, user in enumerate(users)], min_seconds)
+
+        # Kafka 메시지 인코딩 (같은 레코드 묶음을 JSON·바이너리로 인코딩)
+        records = [(i, simulator._advance_session(i, i + 1, now)) for i in range(len(users))]
+        binary_encoder = BinaryEventEncoder(simulator.users, simulator.songs)
+        benchmarks['encode_json'] = _measure(simulator.encoder.encode, records, min_seconds)
+        benchmarks['encode_binary'] = _measure(binary_encoder.encode, records, min_seconds)
+        result['bytes_per_event'] = {
+            name: round(sum(len(encoder.encode(*args)[1]) for args in records) / len(records), 1)
+            for name, encoder in (('json', simulator.encoder), ('binary', binary_encoder))
+        }
+
+        # 싱크별 _write_event (같은 이벤트 묶음을 한쪽 싱크에만 연결해 측정)
+        events = [(simulator._generate_event(user, i + 1, now),) for i, user in enumerate(users)]
+        _attach_sinks(simulator, directory, 'write-event')
+        kafka_sink, file_sink = simulator.kafka_sink, simulator.file_sink
+        simulator.file_sink = None
+        benchmarks['write_event_kafka'] = _measure(simulator._write_event, events, min_seconds)
+        simulator.kafka_sink, simulator.file_sink = None, file_sink
+        benchmarks['write_event_file'] = _measure(simulator._write_event, events, min_seconds)
+        kafka_sink.close()
+        file_sink.close()
+
+        # 종단 간: 가상 시계 백필을 두 싱크 모두에 최대 속도로 생성
+        end_to_end = result['end_to_end'] = {}
+        for mode in ('tick', 'scheduler'):
+            _attach_sinks(simulator, directory, mode)
+            _, seconds = _timed(lambda: simulator.start_streaming(
+                mode=mode, backfill_start=BACKFILL_START,
+                backfill_end=BACKFILL_START + timedelta(minutes=backfill_minutes)))
+            end_to_end[mode] = {
+                'events': simulator.event_count,
+                'seconds': seconds,
+                'events_per_second': round(simulator.event_count / seconds, 1),
+            }
+
+    # Linux의 ru_maxrss 단위는 KB
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def _case_worker(queue, *args):
+    queue.put(run_case(*args))
+
+
+def _run_case_in_process(*args):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_case_worker, args=(queue, *args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _rates(result):
+    """비교용 (조합, 항목) → 처리량 매핑"""
+    rates = {}
+    for case in result['cases']:
+        key = (case['users'], case['catalog_scale'])
+        for name, value in case['benchmarks'].items():
+            if isinstance(value, dict):
+                rates[key + (name,)] = value['per_second']
+        for mode, value in case['end_to_end'].items():
+            rates[key + (f'end_to_end_{mode}',)] = value['events_per_second']
+    return rates
+
+
+def _print_case(case):
+    print(f"\n👥 사용자 {case['users']:,}명 | 🎵 곡 {case['songs']:,}곡 (배율 {case['catalog_scale']:g}) | "
+          f"🚀 시작 {case['startup_seconds']:.2f}s | 💾 최대 RSS {case['peak_rss_mb']:,.1f}MB")
+    for name, value in case['benchmarks'].items():
+        if isinstance(value, dict):
+            print(f"   {name:<40} {value['per_second']:>14,.0f}/s")
+        else:
+            print(f"   {name:<40} {value:>14.3f}s")
+    for mode, value in case['end_to_end'].items():
+        print(f"   {'end_to_end_' + mode:<40} {value['events_per_second']:>14,.0f} events/s "
+              f"({value['events']:,}개)")
+    for name, value in case.get('bytes_per_event', {}).items():
+        print(f"   {'bytes_per_event_' + name:<40} {value:>14,.1f} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='음악 스트리밍 시뮬레이터 핫 패스 벤치마크')
+    parser.add_argument('--users', default='1000,10000',
+                        help='측정할 사용자 수 목록 (쉼표로 구분, 기본값: 1000,10000)')
+    parser.add_argument('--catalog-scale', default='0.1,1.0',
+                        help='측정할 카탈로그 배율 목록 (1.0 = 약 21만 곡, 기본값: 0.1,1.0)')
+    parser.add_argument('--seconds', type=float, default=1.0,
+                        help='항목별 최소 측정 시간 (초, 기본값: 1.0)')
+    parser.add_argument('--backfill-minutes', type=int, default=10,
+                        help='종단 간 측정에 생성할 가상 시간 (분, 기본값: 10)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='난수 시드 (기본값: 42)')
+    parser.add_argument('--output', '-o', default='benchmark_results.json',
+                        help='결과 JSON 파일 경로 (기본값: benchmark_results.json)')
+    parser.add_argument('--compare', metavar='JSON',
+                        help='이전 결과 파일과 처리량 비교')
+    args = parser.parse_args()
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'seed': args.seed, 'seconds': args.seconds, 'backfill_minutes': args.backfill_minutes},
+        'cases': [],
+    }
+
+    print("⏱️  시뮬레이터 벤치마크 시작")
+    for num_users in [int(n) for n in args.users.split(',')]:
+        for catalog_scale in [float(s) for s in args.catalog_scale.split(',')]:
+            case = _run_case_in_process(num_users, catalog_scale, args.seed, args.seconds, args.backfill_minutes)
+            results['cases'].append(case)
+            _print_case(case)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n📁 결과 저장: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = _rates(json.load(f))
+        print(f"\n📊 {args.compare} 대비 처리량 (1.00x = 동일)")
+        for key, rate in _rates(results).items():
+            if baseline.get(key):
+                users, scale, name = key
+                print(f"   사용자 {users:,} 배율 {scale:g} {name:<40} {rate / baseline[key]:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
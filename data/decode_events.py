@@ -0,0 +1,78 @@
+# decode_events.py
+"""바이너리 이벤트 메시지 디코더
+
+--kafka-encoding binary로 생성한 Kafka 메시지를 읽어 JSON 모드와 같은 JSON 라인으로 복원한다.
+메시지 첫 바이트의 스키마 버전을 확인하며, JSON 메시지('{'로 시작)는 그대로 통과시키므로
+인코딩을 바꾸는 도중 두 형식이 섞인 토픽도 읽을 수 있다.
+"""
+import argparse
+import json
+import struct
+import sys
+
+from kafka import KafkaConsumer
+
+from music_streaming_producer_realistic import EVENT_SCHEMA_VERSION, decode_binary_event
+
+
+def decode_message(value):
+    """Kafka 메시지 값 하나를 JSON(UTF-8) bytes로 변환"""
+    if value[:1] == b'{':
+        return value
+    return json.dumps(decode_binary_event(value), ensure_ascii=False).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='바이너리 음악 스트리밍 이벤트 메시지를 JSON 라인으로 복원')
+    parser.add_argument('--brokers', required=True,
+                        help='Kafka 브로커 주소들 (쉼표로 구분)')
+    parser.add_argument('--topic', required=True,
+                        help='Kafka 토픽 이름')
+    parser.add_argument('--group-id',
+                        help='컨슈머 그룹 (지정하면 오프셋을 커밋해 이어서 읽음)')
+    parser.add_argument('--from-beginning', action='store_true',
+                        help='가장 오래된 메시지부터 읽기 (기본값: 새 메시지만)')
+    parser.add_argument('--max-messages', type=int,
+                        help='이 개수만큼 읽고 종료')
+    parser.add_argument('--idle-timeout', type=float,
+                        help='새 메시지가 이 시간(초) 동안 없으면 종료 (기본값: 계속 대기)')
+    parser.add_argument('--output', '-o',
+                        help='JSON 라인을 저장할 파일 (없으면 표준 출력)')
+    args = parser.parse_args()
+
+    consumer = KafkaConsumer(
+        args.topic,
+        bootstrap_servers=args.brokers.split(','),
+        group_id=args.group_id,
+        enable_auto_commit=args.group_id is not None,
+        auto_offset_reset='earliest' if args.from_beginning else 'latest',
+        consumer_timeout_ms=int(args.idle_timeout * 1000) if args.idle_timeout else float('inf'),
+    )
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    print(f"🔓 스키마 v{EVENT_SCHEMA_VERSION} 디코딩: {args.topic} → {args.output or '표준 출력'}", file=sys.stderr)
+
+    count = errors = 0
+    try:
+        for message in consumer:
+            try:
+                output.write(decode_message(message.value) + b'\n')
+            except (ValueError, IndexError, UnicodeDecodeError, struct.error) as e:
+                # 다른 스키마 버전·깨진 메시지는 건너뛰고 위치만 알림
+                errors += 1
+                print(f"⚠️  디코딩 실패 (파티션 {message.partition}, 오프셋 {message.offset}): {e}", file=sys.stderr)
+                continue
+            count += 1
+            if args.max_messages and count >= args.max_messages:
+                break
+    except KeyboardInterrupt:
+        print("\n🛑 사용자가 중지했습니다.", file=sys.stderr)
+    finally:
+        consumer.close()
+        output.flush()
+        if args.output:
+            output.close()
+        print(f"✅ 총 {count:,}개 메시지 복원{f', {errors:,}개 실패' if errors else ''}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
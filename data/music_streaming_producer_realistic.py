@@ -1,43 +1,1819 @@
 # music_streaming_producer_realistic.py
 import json
+import gzip
+import zlib
 import time
 import random
+import heapq
+from array import array
 import threading
-from datetime import datetime, timedelta
+import queue
+import struct
+from datetime import date, datetime, timedelta
 from kafka import KafkaProducer
 from faker import Faker
 import numpy as np
 import argparse
 import os
+import signal
+import shutil
+import tempfile
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from kafka.partitioner.default import murmur2
+
+try:
+    import zstandard
+except ImportError:  # zstd 파일 압축을 쓸 때만 필요
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 출력을 쓸 때만 필요
+    pa = pq = None
+
+# 곡 카탈로그에서 정수 코드로 저장하는 범주형 값들
+GENRES = ('Pop', 'K-Pop', 'Hip-Hop', 'R&B', 'Rock', 'Electronic', 'Jazz',
+          'Country', 'Folk', 'Alternative', 'Classical', 'Soul')
+ARTIST_TIERS = ('mega', 'top', 'famous', 'indie')
+
+# 스케줄러 모드: 활동 확률이 최대(1.0)일 때의 평균 세션 간격(초)과
+# NextSong이 아닌 페이지에서 다음 행동까지 머무는 시간 범위(초)
+SESSION_GAP_SECONDS = 3 * 3600
+THINK_TIME_SECONDS = (2, 30)
+
+# 사용자 속성 코드 (활동 확률 표의 축 순서)
+ACTIVITY_LEVELS = ('low', 'medium', 'high')
+AGE_GROUPS = ('teen', 'young_adult', 'adult', 'senior')
+
+# 사용자 테이블에서 정수 코드로 저장하는 범주형 값들
+GENDERS = ('M', 'F')
+LEVELS = ('free', 'paid')
+MUSIC_TASTES = ('mainstream', 'indie', 'mixed')
+# 실제 주요 도시들
+USER_CITIES = (
+    'Seoul, KR', 'Tokyo, JP', 'New York, NY', 'Los Angeles, CA', 'London, UK',
+    'Paris, FR', 'Berlin, DE', 'Sydney, AU', 'Toronto, CA', 'Amsterdam, NL',
+    'Stockholm, SE', 'Copenhagen, DK', 'Mumbai, IN', 'Shanghai, CN', 'São Paulo, BR'
+)
+# 연령대별 음악 취향 (AGE_GROUPS 순서)
+AGE_GENRE_PREFERENCES = (
+    ('Pop', 'Hip-Hop', 'K-Pop', 'Electronic'),
+    ('Pop', 'Hip-Hop', 'R&B', 'Electronic', 'Alternative'),
+    ('Pop', 'Rock', 'R&B', 'Country', 'Folk'),
+    ('Rock', 'Jazz', 'Country', 'Folk', 'Classical'),
+)
+# Faker로 한 번만 만들어 두는 이름·userAgent 풀 크기
+USER_POOL_SIZE = 1000
+
+# 세션 상태 기계의 페이지 코드 (전이 행렬의 행·열 순서)
+PAGES = ('Home', 'NextSong', 'Search', 'Browse', 'Thumbs Up', 'Thumbs Down',
+         'Add to Playlist', 'Settings', 'Logout', 'Login', 'Register')
+PAGE_CODES = {page: code for code, page in enumerate(PAGES)}
+HOME = PAGE_CODES['Home']
+NEXT_SONG = PAGE_CODES['NextSong']
+LOGOUT = PAGE_CODES['Logout']
+
+# 액션별 HTTP 메소드
+HTTP_METHODS = {
+    'Thumbs Up': 'PUT', 'Thumbs Down': 'PUT', 'Add to Playlist': 'PUT',
+    'Settings': 'GET', 'Search': 'GET', 'Browse': 'GET', 'NextSong': 'PUT',
+    'Home': 'GET', 'Login': 'PUT', 'Register': 'PUT', 'Logout': 'PUT'
+}
+
+# 기본 시간대별 활동 패턴
+HOURLY_ACTIVITY = (
+    0.05, 0.02, 0.01, 0.01, 0.01, 0.03,
+    0.10, 0.25, 0.40, 0.50, 0.60, 0.70,
+    0.80, 0.75, 0.70, 0.75, 0.85, 0.90,
+    0.95, 1.00, 0.95, 0.85, 0.70, 0.30
+)
+
+# 노래 제목 구성 요소들
+TITLE_WORDS = (
+    'Love', 'Heart', 'Dream', 'Night', 'Day', 'Fire', 'Rain', 'Dance', 'Time', 'Life',
+    'Soul', 'Star', 'Moon', 'Sun', 'Light', 'Dark', 'Blue', 'Red', 'Gold', 'Silver',
+    'Beautiful', 'Perfect', 'Forever', 'Never', 'Always', 'Tonight', 'Yesterday', 'Tomorrow',
+    'Angel', 'Heaven', 'Paradise', 'Ocean', 'Mountain', 'River', 'Wind', 'Storm',
+    'Freedom', 'Journey', 'Adventure', 'Memory', 'Story', 'Magic', 'Wonder', 'Miracle'
+)
+TITLE_CITIES = ('Tokyo', 'Paris', 'LA', 'Seoul', 'London')
+TITLE_PREFIXES = ('My', 'Your', 'Our', 'The')
+
+# 목표 속도 모드: 달성 속도를 보고하는 주기(초)와 "따라가지 못함"으로 보는 달성률 기준
+RATE_REPORT_INTERVAL_SECONDS = 5
+RATE_BEHIND_RATIO = 0.95
+
+# 멀티 프로세스 모드: 토픽 파티션 수를 알 수 없을 때 쓰는 기본값 (README 권장 토픽 설정과 동일)
+DEFAULT_PARTITIONS = 12
+
+# Kafka 출력: 프로듀서 버퍼 크기와 응답 대기 메시지 수 기본 상한. 상한까지 쌓여도 버퍼가 넘치지 않아야
+# in-flight 상한으로 역압이 걸리므로, 이벤트(약 0.5KB)에 레코드·미완성 배치 여유를 더해 메시지당 2KB로 잡음
+KAFKA_BUFFER_MEMORY = 32 * 1024 * 1024
+KAFKA_BYTES_PER_MESSAGE = 2048
+KAFKA_MAX_IN_FLIGHT = KAFKA_BUFFER_MEMORY // KAFKA_BYTES_PER_MESSAGE
+
+# 파이프라인 모드: 생성 스레드가 싱크 큐에 한 번에 넘기는 최대 이벤트 수와 기본 큐 깊이(배치 수)
+PIPELINE_BATCH_SIZE = 500
+DEFAULT_QUEUE_DEPTH = 64
+# 큐가 가득 찼을 때 싱크 스레드가 살아 있는지 다시 확인하는 주기 (초)
+PIPELINE_PUT_TIMEOUT = 0.5
+# 싱크 스레드가 새 배치를 기다리는 최소 시간 (초). --flush-interval 0이어도 빈 큐에서 헛돌지 않게 함
+PIPELINE_MIN_POLL_SECONDS = 0.05
+
+# 스트리밍 집계: 한 번에 벡터 처리하는 레코드 수, 윈도별 top-N 크기, 스케치 크기
+AGGREGATE_BATCH_SIZE = 4096
+AGGREGATE_TOP_N = 10
+HLL_PRECISION = 12           # 레지스터 2^12개 (상대 오차 약 1.6%)
+CMS_DEPTH, CMS_WIDTH = 4, 1 << 14
+CMS_HASH_SEED = 0x5EED        # 행별 해시 시드 생성용 (이벤트 난수 스트림과 무관)
+TOPK_CANDIDATES = 20 * AGGREGATE_TOP_N
+
+# Parquet 출력: 한 번에 열 배치로 변환해 기록하는 이벤트 수 (= 최대 row group 크기)
+PARQUET_BATCH_SIZE = 100000
+
+# 바이너리 이벤트 인코딩(--kafka-encoding binary) 스키마 버전. 필드 배치나 열거형
+# (PAGES, AUTH_STATES, HTTP_METHOD_CODES, LEVELS, GENDERS, ARTIST_TIERS의 값 순서가 곧 코드)이
+# 바뀌면 올려서 예전 디코더가 잘못 읽지 않게 함
+EVENT_SCHEMA_VERSION = 1
+AUTH_STATES = ('Logged In', 'Logged Out', 'Guest')
+HTTP_METHOD_CODES = ('GET', 'PUT')
+
+# 스냅샷 형식 버전 (저장 구조가 바뀌면 올려서 예전 스냅샷을 재사용하지 않게 함)
+SNAPSHOT_VERSION = 2
+# 세션 상태를 스냅샷에 체크포인트하는 주기 (초)
+SNAPSHOT_INTERVAL_SECONDS = 10
+
+
+class SongCatalog:
+    """열 단위(struct-of-arrays) 곡 카탈로그
+
+    곡마다 dict를 두는 대신 필드별 NumPy 배열을 두고, 아티스트·티어·장르·앨범은
+    정수 코드로, 제목은 중복 없는 문자열 풀의 인덱스로 저장한다.
+    곡은 행 번호(row)로 가리키며 인기도 내림차순으로 정렬되어 있다.
+    """
+    
+    COLUMNS = ('song_id', 'artist', 'tier', 'genre', 'album', 'title',
+               'duration', 'year', 'popularity', 'play_count', 'likes')
+    
+    def __init__(self, columns, artist_names, titles):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.artist_names = artist_names
+        self.titles = titles
+    
+    def __len__(self):
+        return len(self.popularity)
+    
+    @staticmethod
+    def title_pool():
+        """생성 가능한 모든 곡 제목과 제목 형식별 (시작 위치, 개수, 확률)"""
+        patterns = [
+            ([f"{a} {b}" for a in TITLE_WORDS for b in TITLE_WORDS], 0.3),
+            ([f"{w} in {c}" for w in TITLE_WORDS for c in TITLE_CITIES], 0.7 * 0.5),
+            ([f"{p} {w}" for p in TITLE_PREFIXES for w in TITLE_WORDS], 0.7 * 0.5 * 0.7),
+            ([f"{w} {n}" for w in TITLE_WORDS for n in range(1, 101)], 0.7 * 0.5 * 0.3),
+        ]
+        titles = []
+        layout = []
+        for pool, probability in patterns:
+            layout.append((len(titles), len(pool), probability))
+            titles.extend(pool)
+        return titles, layout
+    
+    @classmethod
+    def generate(cls, artists):
+        """아티스트 목록으로부터 곡 카탈로그를 벡터 연산으로 생성"""
+        tier_codes = {tier: code for code, tier in enumerate(ARTIST_TIERS)}
+        genre_codes = {genre: code for code, genre in enumerate(GENRES)}
+        
+        artist_names = [artist['name'] for artist in artists]
+        artist_popularity = np.array([artist['popularity'] for artist in artists], dtype=np.int16)
+        artist_tier = np.array([tier_codes[artist['tier']] for artist in artists], dtype=np.uint8)
+        artist_num_genres = np.array([len(artist['genres']) for artist in artists], dtype=np.int8)
+        artist_genres = np.array([
+            [genre_codes[g] for g in (artist['genres'] * 2)[:2]] for artist in artists
+        ], dtype=np.uint8)
+        
+        # 아티스트 티어에 따른 곡 수 결정 (메가 200~500, 톱 80~200, 유명 20~80, 인디 5~30)
+        tier_song_low = np.array([200, 80, 20, 5])
+        tier_song_high = np.array([500, 200, 80, 30])
+        num_songs = np.random.randint(tier_song_low[artist_tier], tier_song_high[artist_tier] + 1)
+        
+        artist = np.repeat(np.arange(len(artists), dtype=np.int32), num_songs)
+        tier = artist_tier[artist]
+        total = len(artist)
+        
+        # 곡 제목 (제목 형식을 고른 뒤 형식 안에서 균등 선택)
+        titles, layout = cls.title_pool()
+        starts = np.array([start for start, _, _ in layout])
+        sizes = np.array([size for _, size, _ in layout])
+        kind = np.searchsorted(np.cumsum([p for _, _, p in layout]), np.random.random(total), side='right')
+        kind = np.minimum(kind, len(layout) - 1)
+        title = (starts[kind] + (np.random.random(total) * sizes[kind]).astype(np.int64)).astype(np.int16)
+        
+        # 아티스트 인기도에 따른 곡 인기도 조정
+        popularity = np.clip(artist_popularity[artist] + np.random.randint(-15, 16, total), 1, 100)
+        
+        # 장르는 아티스트의 주 장르에서 선택
+        genre_slot = (np.random.random(total) * artist_num_genres[artist]).astype(np.int64)
+        genre = artist_genres[artist, genre_slot]
+        
+        # 발매 연도 (인기 아티스트는 최근 곡 위주)
+        tier_year_low = np.array([2015, 2015, 2010, 2000])
+        year = np.random.randint(tier_year_low[tier], 2025)
+        
+        columns = {
+            'song_id': np.arange(1, total + 1, dtype=np.uint32),
+            'artist': artist,
+            'tier': tier,
+            'genre': genre,
+            'album': np.random.randint(1, 21, total).astype(np.uint8),
+            'title': title,
+            'duration': np.random.randint(90, 421, total).astype(np.int16),  # 1.5분~7분
+            'year': year.astype(np.int16),
+            'popularity': popularity.astype(np.uint8),
+            'play_count': np.random.randint(100, 10000001, total).astype(np.int32),  # 재생 횟수
+            'likes': np.random.randint(10, 500001, total).astype(np.int32),  # 좋아요 수
+        }
+        
+        # 인기도별로 정렬하여 차트 효과 구현 (같은 인기도는 생성 순서 유지)
+        order = np.argsort(-columns['popularity'].astype(np.int16), kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+        
+        return cls(columns, artist_names, titles)
+    
+    def save(self, directory):
+        """열마다 .npy 파일로 저장 (나중에 메모리 매핑으로 열 수 있음)"""
+        os.makedirs(directory, exist_ok=True)
+        for name in self.COLUMNS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'pools.json'), 'w', encoding='utf-8') as f:
+            json.dump({'artist_names': self.artist_names, 'titles': self.titles}, f, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, directory):
+        """저장된 카탈로그를 메모리 매핑으로 열기 (필요한 페이지만 디스크에서 읽음)"""
+        columns = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in cls.COLUMNS
+        }
+        with open(os.path.join(directory, 'pools.json'), encoding='utf-8') as f:
+            pools = json.load(f)
+        return cls(columns, pools['artist_names'], pools['titles'])
+    
+    def song(self, row):
+        """행 번호의 곡을 기존 dict 형태로 꺼내기"""
+        artist_name = self.artist_names[self.artist[row]]
+        return {
+            'song_id': f'TR_{int(self.song_id[row]):08d}',
+            'title': self.titles[self.title[row]],
+            'artist': artist_name,
+            'artist_tier': ARTIST_TIERS[self.tier[row]],
+            'album': f"{artist_name} - Album {int(self.album[row])}",
+            'genre': GENRES[self.genre[row]],
+            'duration': int(self.duration[row]),
+            'year': int(self.year[row]),
+            'popularity': int(self.popularity[row]),
+            'play_count': int(self.play_count[row]),
+            'likes': int(self.likes[row]),
+        }
+
+
+class UserTable:
+    """열 단위(struct-of-arrays) 사용자 테이블
+
+    이름·userAgent는 Faker로 한 번 만든 풀의 인덱스로, 나머지 속성은 정수 코드 배열로
+    저장하고 전체 사용자를 벡터 연산으로 한 번에 생성한다. 사용자는 위치(index)로
+    가리키며, 기존 dict 형태는 필요할 때 위치별로 만들어 반환한다.
+    """
+    
+    COLUMNS = ('user_id', 'first_name', 'last_name', 'gender', 'age', 'age_group', 'level',
+               'location', 'user_agent', 'registration', 'genre_a', 'genre_b', 'music_taste',
+               'activity_level')
+    POOLS = ('first_names', 'last_names', 'user_agents')
+    
+    def __init__(self, columns, pools):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.pools = pools
+        self.first_names = pools['first_names']
+        self.last_names = pools['last_names']
+        self.user_agents = pools['user_agents']
+    
+    def __len__(self):
+        return len(self.user_id)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.user(i) for i in range(*index.indices(len(self)))]
+        return self.user(index)
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.user(i)
+    
+    @classmethod
+    def generate(cls, num_users, fake, reference_date):
+        """사용자 num_users명을 벡터 연산으로 생성 (이름·userAgent는 Faker 풀에서 선택)"""
+        pools = {
+            'first_names': [fake.first_name() for _ in range(USER_POOL_SIZE)],
+            'last_names': [fake.last_name() for _ in range(USER_POOL_SIZE)],
+            'user_agents': [fake.user_agent() for _ in range(USER_POOL_SIZE)],
+        }
+        
+        # 연령대 결정 (실제 음원 서비스 사용자 분포 반영: 10대 30%, 20-30대 30%, 40-50대 25%, 60대+ 15%)
+        age_group = np.searchsorted(np.cumsum([0.3, 0.3, 0.25, 0.15]), np.random.random(num_users), side='right')
+        age_group = np.minimum(age_group, len(AGE_GROUPS) - 1).astype(np.uint8)
+        age_low = np.array([13, 20, 36, 56])
+        age_high = np.array([19, 35, 55, 75])
+        age = np.random.randint(age_low[age_group], age_high[age_group] + 1).astype(np.uint8)
+        
+        # 유료 사용자 비율 (연령대별로 다름: 10대 15%, 20-50대 35%, 60대+ 25%)
+        paid_rate = np.array([0.15, 0.35, 0.35, 0.25])
+        level = (np.random.random(num_users) < paid_rate[age_group]).astype(np.uint8)
+        
+        # 연령대별 선호 장르 중 서로 다른 두 개 (행마다 난수 정렬 순서의 앞 두 개)
+        genre_a = np.zeros(num_users, dtype=np.uint8)
+        genre_b = np.zeros(num_users, dtype=np.uint8)
+        for code, preferences in enumerate(AGE_GENRE_PREFERENCES):
+            rows = np.flatnonzero(age_group == code)
+            genre_codes = np.array([GENRES.index(genre) for genre in preferences], dtype=np.uint8)
+            picks = np.argsort(np.random.random((len(rows), len(preferences))), axis=1)[:, :2]
+            genre_a[rows] = genre_codes[picks[:, 0]]
+            genre_b[rows] = genre_codes[picks[:, 1]]
+        
+        # 기준일(기본값: 오늘)로부터 최근 5년 사이의 가입일 (date 서수)
+        reference_day = (reference_date or date.today()).toordinal()
+        registration = np.random.randint(reference_day - 5 * 365, reference_day + 1, num_users).astype(np.int32)
+        
+        columns = {
+            'user_id': np.arange(1, num_users + 1, dtype=np.int64),
+            'first_name': np.random.randint(0, USER_POOL_SIZE, num_users).astype(np.uint16),
+            'last_name': np.random.randint(0, USER_POOL_SIZE, num_users).astype(np.uint16),
+            'gender': np.random.randint(0, len(GENDERS), num_users).astype(np.uint8),
+            'age': age,
+            'age_group': age_group,
+            'level': level,
+            'location': np.random.randint(0, len(USER_CITIES), num_users).astype(np.uint8),
+            'user_agent': np.random.randint(0, USER_POOL_SIZE, num_users).astype(np.uint16),
+            'registration': registration,
+            'genre_a': genre_a,
+            'genre_b': genre_b,
+            'music_taste': np.random.randint(0, len(MUSIC_TASTES), num_users).astype(np.uint8),  # 음악 취향
+            'activity_level': np.random.randint(0, len(ACTIVITY_LEVELS), num_users).astype(np.uint8),  # 활동 수준
+        }
+        return cls(columns, pools)
+    
+    def take(self, rows):
+        """지정한 위치의 사용자만 남긴 테이블 (워커 샤딩용)"""
+        return UserTable({name: np.asarray(getattr(self, name))[rows] for name in self.COLUMNS}, self.pools)
+    
+    def save(self, directory):
+        """열마다 .npy 파일로 저장 (나중에 메모리 매핑으로 열 수 있음)"""
+        os.makedirs(directory, exist_ok=True)
+        for name in self.COLUMNS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'pools.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.pools, f, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, directory):
+        """저장된 사용자 테이블을 메모리 매핑으로 열기"""
+        columns = {
+            name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+            for name in cls.COLUMNS
+        }
+        with open(os.path.join(directory, 'pools.json'), encoding='utf-8') as f:
+            pools = json.load(f)
+        return cls(columns, pools)
+    
+    def song_preferences(self, index):
+        """곡 선택에 쓰는 (음악 취향, 선호 장르들) (dict를 만들지 않고 바로 조회)"""
+        return MUSIC_TASTES[self.music_taste[index]], (GENRES[self.genre_a[index]], GENRES[self.genre_b[index]])
+    
+    def user(self, index):
+        """위치의 사용자를 기존 dict 형태로 꺼내기"""
+        return {
+            'user_id': int(self.user_id[index]),
+            'first_name': self.first_names[self.first_name[index]],
+            'last_name': self.last_names[self.last_name[index]],
+            'gender': GENDERS[self.gender[index]],
+            'age': int(self.age[index]),
+            'age_group': AGE_GROUPS[self.age_group[index]],
+            'level': LEVELS[self.level[index]],
+            'location': USER_CITIES[self.location[index]],
+            'user_agent': self.user_agents[self.user_agent[index]],
+            'registration': date.fromordinal(int(self.registration[index])),
+            'favorite_genres': [GENRES[self.genre_a[index]], GENRES[self.genre_b[index]]],
+            'music_taste': MUSIC_TASTES[self.music_taste[index]],
+            'activity_level': ACTIVITY_LEVELS[self.activity_level[index]],
+        }
+
+
+class AliasTable:
+    """가중치에 비례해 O(1)로 한 곡을 뽑는 Walker/Vose 별칭(alias) 테이블
+
+    열 i를 고르면 prob[i] 확률로 rows[i]를, 아니면 alias_rows[i]를 반환한다.
+    구성은 NumPy로 하되, Vose 알고리즘에서 큰 칸 하나가 작은 칸 여러 개를 한 번에
+    받도록 누적합으로 짝을 지어 몇 번의 벡터 연산 라운드로 끝낸다.
+    추첨 중 원소 접근은 array.array로 해서 파이썬 숫자를 바로 얻는다.
+    """
+    
+    def __init__(self, rows, weights):
+        prob, alias = self.build(weights)
+        rows = np.asarray(rows, dtype=np.int32)
+        self.size = len(rows)
+        self.total = float(weights.sum())
+        self.prob = array('d', prob.tobytes())
+        self.rows = array('i', rows.tobytes())
+        self.alias_rows = array('i', rows[alias].tobytes())
+    
+    @staticmethod
+    def build(weights):
+        """가중치 배열로 (prob, alias) 배열 구성"""
+        n = len(weights)
+        prob = np.asarray(weights, dtype=np.float64) * (n / weights.sum())
+        alias = np.arange(n)
+        small = np.flatnonzero(prob < 1.0)
+        large = np.flatnonzero(prob >= 1.0)
+        while len(small) and len(large):
+            # 작은 칸의 부족분을 차례로 이어 붙였을 때 시작점이 놓이는 큰 칸의 잉여분 구간이 그 칸의 별칭
+            deficit = 1.0 - prob[small]
+            deficit_start = np.cumsum(deficit) - deficit
+            surplus_end = np.cumsum(prob[large] - 1.0)
+            owner = np.minimum(np.searchsorted(surplus_end, deficit_start, side='right'), len(large) - 1)
+            alias[small] = large[owner]
+            prob[large] -= np.bincount(owner, weights=deficit, minlength=len(large))
+            # 잉여분보다 많이 내준 큰 칸은 다음 라운드에서 작은 칸이 됨
+            still_large = prob[large] >= 1.0
+            small = large[~still_large]
+            large = large[still_large]
+        # 부동소수점 오차로 남은 칸은 자기 자신만 가리킴
+        prob[small] = 1.0
+        prob[large] = 1.0
+        return prob, alias
+    
+    def sample(self):
+        """가중치에 비례해 곡 행 번호 하나 추첨 (균등 난수 하나의 정수부로 열, 소수부로 열 안의 선택)"""
+        u = random.random() * self.size
+        column = int(u)
+        if u - column < self.prob[column]:
+            return self.rows[column]
+        return self.alias_rows[column]
+
+
+class WallClock:
+    """실제 시계 (대기 시 실제로 잠듦)"""
+    
+    simulated = False
+    
+    def now(self):
+        return datetime.now()
+    
+    def time(self):
+        return time.time()
+    
+    def sleep(self, seconds):
+        time.sleep(seconds)
+    
+    def wait_until(self, ts):
+        # 종료·중지 확인을 위해 한 번에 최대 1초만 대기
+        time.sleep(min(max(ts - time.time(), 0), 1.0))
+
+
+class SimulatedClock:
+    """가상 시계 (대기 시 잠들지 않고 시각만 앞으로 이동, 백필용)"""
+    
+    simulated = True
+    
+    def __init__(self, start):
+        self.ts = start.timestamp()
+    
+    def now(self):
+        return datetime.fromtimestamp(self.ts)
+    
+    def time(self):
+        return self.ts
+    
+    def sleep(self, seconds):
+        self.ts += seconds
+    
+    def wait_until(self, ts):
+        self.ts = max(self.ts, ts)
+
+
+# 목표 속도 모드: 모자란 토큰이 이 시간 분량 이상일 때만 잠듦 (초)
+PACER_MIN_SLEEP_SECONDS = 0.005
+
+
+class RatePacer:
+    """토큰 버킷으로 초당 이벤트 수를 목표치에 맞추고 달성 속도를 보고
+
+    토큰은 초당 target_rate개씩 최대 1초 분량까지 쌓이고, 이벤트를 내보내기 직전에
+    하나씩 소비한다. 모자란 토큰이 PACER_MIN_SLEEP_SECONDS 분량을 넘으면 그만큼 잠들어
+    속도를 낮추므로 낮은 목표 속도에서도 한 틱의 이벤트가 한꺼번에 나가지 않고,
+    생성기가 목표보다 느리면 잠들지 않으므로 틱 간격이 자동으로 줄어든다.
+    """
+    
+    def __init__(self, target_rate, label=''):
+        self.target_rate = target_rate
+        self.label = label
+        self.capacity = target_rate
+        self.tokens = 0.0  # 시작 직후 1초 분량이 한꺼번에 나가지 않도록 빈 버킷에서 시작
+        self.started = self.last_refill = self.last_report = time.monotonic()
+        self.emitted = 0
+        self.reported_emitted = 0
+        self.throttled = 0.0  # 마지막 보고 이후 목표를 넘어서 잠든 시간
+    
+    def acquire(self):
+        """이벤트 하나를 내보내기 직전에 호출 (목표보다 빠르면 잠듦, 잠들었으면 True)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.target_rate) - 1
+        self.last_refill = now
+        
+        slept = False
+        # 부족분이 아주 작을 때마다 잠들면 sleep 호출 비용 때문에 높은 목표 속도에 못 미침
+        wait = -self.tokens / self.target_rate
+        if wait >= PACER_MIN_SLEEP_SECONDS:
+            self.throttled += wait
+            time.sleep(wait)
+            slept = True
+        self.emitted += 1
+        
+        if now - self.last_report >= RATE_REPORT_INTERVAL_SECONDS:
+            self.report(now)
+        return slept
+    
+    def report(self, now):
+        """최근 구간·전체 달성 속도와 목표 대비 밀린 이벤트 수 출력"""
+        interval = now - self.last_report
+        recent_rate = (self.emitted - self.reported_emitted) / interval
+        overall_rate = self.emitted / max(now - self.started, 1e-9)
+        backlog = max(0, int(self.target_rate * (now - self.started)) - self.emitted)
+        print(f"{self.label}🎯 목표 {self.target_rate:,.0f}/s | 최근 {recent_rate:,.0f}/s | 전체 평균 {overall_rate:,.0f}/s | "
+              f"밀린 이벤트 {backlog:,}개")
+        
+        # 한 번도 속도를 늦추지 않았는데 목표에 못 미치면 생성기가 병목
+        if recent_rate < self.target_rate * RATE_BEHIND_RATIO and self.throttled == 0:
+            print(f"{self.label}⚠️  생성기가 목표 속도를 따라가지 못합니다 "
+                  f"(목표의 {recent_rate / self.target_rate:.0%}). --workers로 프로세스를 늘려 보세요.")
+        
+        self.last_report = now
+        self.reported_emitted = self.emitted
+        self.throttled = 0.0
+    
+    def summary(self):
+        """실행 종료 시 목표 대비 최종 달성 속도"""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        overall_rate = self.emitted / elapsed
+        print(f"{self.label}🎯 목표 {self.target_rate:,.0f}/s 대비 평균 {overall_rate:,.0f}/s 달성 "
+              f"({overall_rate / self.target_rate:.0%}, {elapsed:,.1f}초)")
+
+
+class SessionTable:
+    """사용자 위치별 고정 크기 세션 레코드 (병렬 배열)
+
+    세션마다 dict와 재생곡 목록을 만드는 대신 사용자 수만큼 미리 잡은 배열에
+    세션 ID, 현재 페이지 코드(세션이 없으면 -1), 현재 곡 행 번호, 시작 시각(epoch 초),
+    세션 내 순번, 재생한 곡 수, 세션 길이(초)만 저장한다.
+    이벤트 하나를 처리할 때는 array.array로 원소 단위 접근하고(파이썬 int 그대로 반환),
+    여러 사용자를 한 번에 볼 때는 같은 메모리를 공유하는 NumPy 뷰(views)를 쓴다.
+    """
+    
+    FIELDS = (('session_id', 'q', 0), ('page', 'b', -1), ('song', 'i', -1), ('start', 'd', 0),
+              ('items', 'i', 0), ('played', 'h', 0), ('duration', 'i', 0))
+    
+    def __init__(self, size):
+        self.views = {}
+        for name, typecode, fill in self.FIELDS:
+            column = array(typecode, [fill]) * size
+            setattr(self, name, column)
+            self.views[name] = np.frombuffer(column, dtype=typecode)
+        self.open_sessions = 0
+    
+    def open(self, user_idx, session_id, start_ts, duration):
+        """새 세션 시작 (Home 페이지에서 출발)"""
+        self.session_id[user_idx] = session_id
+        self.page[user_idx] = HOME
+        self.song[user_idx] = -1
+        self.start[user_idx] = start_ts
+        self.items[user_idx] = 0
+        self.played[user_idx] = 0
+        self.duration[user_idx] = duration
+        self.open_sessions += 1
+    
+    def close(self, user_idx):
+        self.page[user_idx] = -1
+        self.open_sessions -= 1
+    
+    def drop_started_after(self, ts):
+        """ts(epoch 초)보다 늦게 시작한 세션 닫기 (시계가 체크포인트보다 과거에서 시작할 때)"""
+        rows = np.flatnonzero((self.views['page'] >= 0) & (self.views['start'] > ts))
+        self.views['page'][rows] = -1
+        self.open_sessions -= len(rows)
+        return len(rows)
+    
+    def is_open(self, user_idx):
+        return self.page[user_idx] >= 0
+    
+    def pages(self, user_indices):
+        """여러 사용자의 현재 페이지 코드를 한 번에 조회"""
+        return self.views['page'][user_indices]
+    
+    def export(self, user_ids):
+        """진행 중인 세션만 userId와 함께 배열 dict로 꺼내기 (체크포인트용)"""
+        rows = np.flatnonzero(self.views['page'] >= 0)
+        state = {name: view[rows] for name, view in self.views.items()}
+        state['user_id'] = np.asarray(user_ids, dtype=np.int64)[rows]
+        return state
+    
+    def restore(self, state, user_ids):
+        """export한 세션을 userId로 사용자 위치를 찾아 복원 (이 사용자 목록에 없는 세션은 무시)"""
+        # NpzFile은 키로 꺼낼 때마다 압축 파일에서 배열을 다시 읽으므로 한 번만 꺼냄
+        arrays = {name: state[name] for name in state.files}
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not len(user_ids):
+            return
+        order = np.argsort(user_ids, kind='stable')
+        sorted_ids = user_ids[order]
+        found = np.minimum(np.searchsorted(sorted_ids, arrays['user_id']), len(sorted_ids) - 1)
+        mask = sorted_ids[found] == arrays['user_id']
+        positions = order[found[mask]]
+        for name, view in self.views.items():
+            view[positions] = arrays[name][mask]
+        self.open_sessions += len(positions)
+
+
+def _json(value):
+    """json.dumps(event, ensure_ascii=False)와 같은 형식으로 값 하나를 UTF-8 bytes로 인코딩"""
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+class JsonEventEncoder:
+    """이벤트 레코드를 JSON bytes로 조립하는 템플릿 인코더
+
+    사용자마다 바뀌지 않는 필드(위치, userAgent, 이름, 성별, 나이, 등급, 가입일)와
+    곡마다 바뀌지 않는 NextSong 필드는 처음 쓰일 때 한 번만 JSON 조각으로 만들어 두고,
+    이벤트마다 ts·sessionId·page·method·itemInSession만 끼워 넣는다.
+    결과는 json.dumps(event, ensure_ascii=False)와 바이트 단위로 같다.
+    """
+    
+    # page부터 level 값 직전까지 (page·auth·method·status는 페이지에 따라서만 달라짐)
+    PAGE_FRAGMENTS = tuple(
+        b', "page": ' + _json(page) + b', "auth": "Logged In", "method": ' + _json(HTTP_METHODS.get(page, 'GET'))
+        + b', "status": 200, "level": '
+        for page in PAGES
+    )
+    
+    def __init__(self, users, songs):
+        self.users = users
+        self.songs = songs
+        self.user_fragments = [None] * len(users)
+        self.song_fragments = [None] * len(songs)
+    
+    def user_fragment(self, user_idx):
+        """사용자 위치별 (Kafka 키, userId 조각, level 조각, 나머지 고정 필드 조각)"""
+        fragment = self.user_fragments[user_idx]
+        if fragment is None:
+            user = self.users[user_idx]
+            registration = int(datetime.combine(user['registration'], datetime.min.time()).timestamp()) * 1000
+            fragment = (
+                str(user['user_id']).encode('utf-8'),
+                b', "userId": %d, "sessionId": ' % user['user_id'],
+                _json(user['level']) + b', "itemInSession": ',
+                b''.join((
+                    b', "location": ', _json(user['location']),
+                    b', "userAgent": ', _json(user['user_agent']),
+                    b', "firstName": ', _json(user['first_name']),
+                    b', "lastName": ', _json(user['last_name']),
+                    b', "gender": ', _json(user['gender']),
+                    b', "age": %d, "registration": %d' % (user['age'], registration),
+                )),
+            )
+            self.user_fragments[user_idx] = fragment
+        return fragment
+    
+    def song_fragment(self, song_row):
+        """곡 행 번호별 NextSong 필드 조각"""
+        fragment = self.song_fragments[song_row]
+        if fragment is None:
+            songs = self.songs
+            fragment = b''.join((
+                b', "artist": ', _json(songs.artist_names[songs.artist[song_row]]),
+                b', "song": ', _json(songs.titles[songs.title[song_row]]),
+                b', "length": %d, "artist_tier": ' % songs.duration[song_row],
+                _json(ARTIST_TIERS[songs.tier[song_row]]),
+                b', "song_popularity": %d' % songs.popularity[song_row],
+            ))
+            self.song_fragments[song_row] = fragment
+        return fragment
+    
+    def encode(self, user_idx, record):
+        """레코드 하나를 (Kafka 키, JSON bytes)로 인코딩"""
+        ts, session_id, page, item_in_session, song_row = record
+        key, user_head, level, user_tail = self.user_fragment(user_idx)
+        song = self.song_fragment(song_row) if song_row >= 0 else b''
+        payload = b'{"ts": %d%s%d%s%s%d%s%s}' % (
+            ts, user_head, session_id, self.PAGE_FRAGMENTS[page], level, item_in_session, user_tail, song)
+        return key, payload
+
+
+# 바이너리 이벤트 레이아웃 (little-endian, 문자열은 varint 길이 + UTF-8)
+#   헤더: 스키마 버전 u8, ts i64, sessionId u64, itemInSession u32
+#   페이지: page u8, auth u8, method u8, status u16
+#   사용자: userId u32, level u8, location, userAgent, firstName, lastName, gender u8, age u8, registration i64
+#   곡: NextSong 필드 유무 u8, 있으면 artist, song, length u16, artist_tier u8, song_popularity u8
+BINARY_HEADER = struct.Struct('<BqQI')
+BINARY_PAGE = struct.Struct('<BBBH')
+BINARY_USER_HEAD = struct.Struct('<IB')
+BINARY_USER_TAIL = struct.Struct('<BBq')
+BINARY_SONG_TAIL = struct.Struct('<HBB')
+
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _binary_string(value):
+    data = value.encode('utf-8')
+    return _varint(len(data)) + data
+
+
+def _read_binary_string(data, offset):
+    length = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        length |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return bytes(data[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def _binary_page(page, auth, method, status):
+    return BINARY_PAGE.pack(PAGE_CODES[page], AUTH_STATES.index(auth), HTTP_METHOD_CODES.index(method), status)
+
+
+def _binary_user(user_id, level, location, user_agent, first_name, last_name, gender, age, registration):
+    return b''.join((
+        BINARY_USER_HEAD.pack(user_id, LEVELS.index(level)),
+        _binary_string(location), _binary_string(user_agent),
+        _binary_string(first_name), _binary_string(last_name),
+        BINARY_USER_TAIL.pack(GENDERS.index(gender), age, registration),
+    ))
+
+
+def _binary_song(artist, song, length, artist_tier, song_popularity):
+    return b''.join((
+        b'\x01', _binary_string(artist), _binary_string(song),
+        BINARY_SONG_TAIL.pack(length, ARTIST_TIERS.index(artist_tier), song_popularity),
+    ))
+
+
+def encode_binary_event(event):
+    """이벤트 dict를 바이너리 스키마로 인코딩"""
+    song = b'\x00'
+    if 'artist' in event:
+        song = _binary_song(event['artist'], event['song'], event['length'],
+                            event['artist_tier'], event['song_popularity'])
+    return b''.join((
+        BINARY_HEADER.pack(EVENT_SCHEMA_VERSION, event['ts'], event['sessionId'], event['itemInSession']),
+        _binary_page(event['page'], event['auth'], event['method'], event['status']),
+        _binary_user(event['userId'], event['level'], event['location'], event['userAgent'],
+                     event['firstName'], event['lastName'], event['gender'], event['age'], event['registration']),
+        song,
+    ))
+
+
+def decode_binary_event(data):
+    """바이너리 이벤트를 JSON 출력과 같은 필드 순서의 이벤트 dict로 복원"""
+    if data[0] != EVENT_SCHEMA_VERSION:
+        raise ValueError(f"지원하지 않는 이벤트 스키마 버전: {data[0]} (지원: {EVENT_SCHEMA_VERSION})")
+    _, ts, session_id, item_in_session = BINARY_HEADER.unpack_from(data, 0)
+    offset = BINARY_HEADER.size
+    page, auth, method, status = BINARY_PAGE.unpack_from(data, offset)
+    offset += BINARY_PAGE.size
+    user_id, level = BINARY_USER_HEAD.unpack_from(data, offset)
+    offset += BINARY_USER_HEAD.size
+    location, offset = _read_binary_string(data, offset)
+    user_agent, offset = _read_binary_string(data, offset)
+    first_name, offset = _read_binary_string(data, offset)
+    last_name, offset = _read_binary_string(data, offset)
+    gender, age, registration = BINARY_USER_TAIL.unpack_from(data, offset)
+    offset += BINARY_USER_TAIL.size
+    
+    event = {
+        'ts': ts,
+        'userId': user_id,
+        'sessionId': session_id,
+        'page': PAGES[page],
+        'auth': AUTH_STATES[auth],
+        'method': HTTP_METHOD_CODES[method],
+        'status': status,
+        'level': LEVELS[level],
+        'itemInSession': item_in_session,
+        'location': location,
+        'userAgent': user_agent,
+        'firstName': first_name,
+        'lastName': last_name,
+        'gender': GENDERS[gender],
+        'age': age,
+        'registration': registration,
+    }
+    if data[offset]:
+        artist, offset = _read_binary_string(data, offset + 1)
+        song, offset = _read_binary_string(data, offset)
+        length, artist_tier, song_popularity = BINARY_SONG_TAIL.unpack_from(data, offset)
+        event.update({
+            'artist': artist,
+            'song': song,
+            'length': length,
+            'artist_tier': ARTIST_TIERS[artist_tier],
+            'song_popularity': song_popularity,
+        })
+    return event
+
+
+class BinaryEventEncoder:
+    """이벤트 레코드를 바이너리 스키마(EVENT_SCHEMA_VERSION)로 조립하는 템플릿 인코더
+
+    JsonEventEncoder와 같은 방식으로 사용자·곡·페이지별 고정 부분은 처음 쓰일 때
+    한 번만 인코딩해 두고, 이벤트마다 헤더(ts, sessionId, itemInSession)만 pack해서 붙인다.
+    필드 이름이 빠지고 숫자·열거형이 고정 폭이라 JSON보다 메시지가 훨씬 작다.
+    """
+    
+    PAGE_FRAGMENTS = tuple(
+        _binary_page(page, 'Logged In', HTTP_METHODS.get(page, 'GET'), 200) for page in PAGES
+    )
+    
+    def __init__(self, users, songs):
+        self.users = users
+        self.songs = songs
+        self.user_fragments = [None] * len(users)
+        self.song_fragments = [None] * len(songs)
+    
+    def user_fragment(self, user_idx):
+        """사용자 위치별 (Kafka 키, 사용자 필드 조각)"""
+        fragment = self.user_fragments[user_idx]
+        if fragment is None:
+            user = self.users[user_idx]
+            registration = int(datetime.combine(user['registration'], datetime.min.time()).timestamp()) * 1000
+            fragment = (
+                str(user['user_id']).encode('utf-8'),
+                _binary_user(user['user_id'], user['level'], user['location'], user['user_agent'],
+                             user['first_name'], user['last_name'], user['gender'], user['age'], registration),
+            )
+            self.user_fragments[user_idx] = fragment
+        return fragment
+    
+    def song_fragment(self, song_row):
+        """곡 행 번호별 NextSong 필드 조각"""
+        fragment = self.song_fragments[song_row]
+        if fragment is None:
+            songs = self.songs
+            fragment = _binary_song(songs.artist_names[songs.artist[song_row]], songs.titles[songs.title[song_row]],
+                                    int(songs.duration[song_row]), ARTIST_TIERS[songs.tier[song_row]],
+                                    int(songs.popularity[song_row]))
+            self.song_fragments[song_row] = fragment
+        return fragment
+    
+    def encode(self, user_idx, record):
+        """레코드 하나를 (Kafka 키, 바이너리 bytes)로 인코딩"""
+        ts, session_id, page, item_in_session, song_row = record
+        key, user = self.user_fragment(user_idx)
+        song = self.song_fragment(song_row) if song_row >= 0 else b'\x00'
+        return key, (BINARY_HEADER.pack(EVENT_SCHEMA_VERSION, ts, session_id, item_in_session)
+                     + self.PAGE_FRAGMENTS[page] + user + song)
+
+
+class KafkaSink:
+    """Kafka 출력 (배치·압축 설정, 전송 결과 추적, in-flight 상한으로 역압)
+
+    이벤트는 생성 쪽에서 이미 직렬화된 bytes로 받는다. 브로커 응답을 기다리는
+    메시지가 max_in_flight개에 이르면 send가 멈춰 생성 속도를 늦추므로,
+    브로커가 느려도 프로듀서 버퍼가 끝없이 커지지 않는다.
+    """
+    
+    def __init__(self, brokers, topic, linger_ms=20, batch_size=256 * 1024, compression=None,
+                 acks=1, buffer_memory=KAFKA_BUFFER_MEMORY, max_in_flight=None, producer=None):
+        self.topic = topic
+        # producer를 넘기면 그대로 사용 (벤치마크의 프로세스 내 가짜 프로듀서 등)
+        self.producer = producer or KafkaProducer(
+            bootstrap_servers=brokers,
+            linger_ms=linger_ms,
+            batch_size=batch_size,
+            compression_type=compression,
+            acks=acks,
+            buffer_memory=buffer_memory
+        )
+        # 상한을 따로 주지 않으면 버퍼 크기에 맞춰 정함 (기본 32MB → 16384개)
+        if max_in_flight is None:
+            max_in_flight = buffer_memory // KAFKA_BYTES_PER_MESSAGE
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        
+        # 전송 결과 통계 (콜백은 프로듀서 I/O 스레드에서 호출됨)
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.delivered = 0
+        self.errors = 0
+        self.send_failures = 0  # errors 중 send 호출 자체가 실패한 건 (sent에 포함되지 않음)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.blocked_seconds = 0.0  # in-flight 상한 때문에 생성이 멈춘 시간
+    
+    def send(self, key, value):
+        """직렬화된 key/value 전송 (응답 대기 메시지가 상한이면 자리가 날 때까지 대기)"""
+        if not self.in_flight.acquire(blocking=False):
+            blocked_at = time.monotonic()
+            self.in_flight.acquire()
+            self.blocked_seconds += time.monotonic() - blocked_at
+        
+        try:
+            future = self.producer.send(self.topic, key=key, value=value)
+        except Exception as e:
+            # 버퍼·메타데이터 대기 시간 초과 등으로 보내지도 못한 경우: 자리를 돌려주고 실패로 집계
+            with self.lock:
+                self.send_failures += 1
+            self._on_error(e)
+            return
+        self.sent += 1
+        future.add_callback(self._on_delivery, time.monotonic())
+        future.add_errback(self._on_error)
+    
+    def _on_delivery(self, sent_at, metadata):
+        latency = time.monotonic() - sent_at
+        with self.lock:
+            self.delivered += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+        self.in_flight.release()
+    
+    def _on_error(self, exc):
+        with self.lock:
+            self.errors += 1
+            first_error = self.errors == 1
+        self.in_flight.release()
+        if first_error:
+            print(f"❌ Kafka 전송 실패: {exc!r} (이후 실패는 통계에만 집계)")
+    
+    def stats(self):
+        """(전송, 확인, 실패, 지연 합계, 지연 최대) 스냅샷"""
+        with self.lock:
+            return self.sent, self.delivered, self.errors, self.latency_sum, self.latency_max
+    
+    def pending(self):
+        """브로커 응답을 기다리는 메시지 수"""
+        with self.lock:
+            return self.sent - self.delivered - (self.errors - self.send_failures)
+    
+    def stats_line(self):
+        """전송·확인·실패 건수와 전송 지연 요약"""
+        sent, delivered, errors, latency_sum, latency_max = self.stats()
+        latency_avg = latency_sum / delivered if delivered else 0.0
+        pending = self.pending()
+        return (f"Kafka 전송 {sent:,} | 확인 {delivered:,} | 실패 {errors:,} | 대기 {pending:,} | "
+                f"지연 평균 {latency_avg * 1000:,.1f}ms 최대 {latency_max * 1000:,.1f}ms | "
+                f"역압 대기 {self.blocked_seconds:,.1f}s")
+    
+    def close(self, timeout=10):
+        """남은 메시지 전송 (최대 timeout초만 대기) 후 종료"""
+        try:
+            self.producer.flush(timeout=timeout)
+        except Exception:
+            pass
+        finally:
+            self.producer.close(timeout=0)       # 즉시 닫기
+
+
+class FileSink:
+    """JSON 라인 파일 출력 (큰 버퍼, 시간·크기 기준 flush, 크기·시간 기준 회전, gzip/zstd 스트리밍 압축)
+
+    이벤트는 메모리 버퍼에 모았다가 flush_interval초마다 또는 buffer_size를 넘으면
+    한 번에 기록하므로, 비정상 종료 시 잃는 데이터는 최대 한 flush 구간이다.
+    압축 파일도 flush마다 블록을 마무리해 그때까지의 내용은 온전히 읽을 수 있다.
+    """
+    
+    SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+    
+    def __init__(self, path, flush_interval=1.0, buffer_size=1 << 20, rotate_bytes=None,
+                 rotate_seconds=None, compression=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compression = compression
+        
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.bytes_written = 0  # 압축 전 기준 누적 기록량
+        self.files = []
+        self.sequence = 0
+        self._open_next()
+    
+    def _next_path(self):
+        """다음 출력 파일 경로 (회전 시 기존 파일을 덮어쓰지 않도록 빈 번호 사용)"""
+        suffix = self.SUFFIXES[self.compression]
+        if not (self.rotate_bytes or self.rotate_seconds):
+            return self.path + suffix
+        stem, ext = os.path.splitext(self.path)
+        while True:
+            path = f"{stem}-{self.sequence:05d}{ext}{suffix}"
+            self.sequence += 1
+            if not os.path.exists(path):
+                return path
+    
+    def _open_next(self):
+        path = self._next_path()
+        self.raw = open(path, 'wb')
+        if self.compression == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=6)
+        elif self.compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor(level=3).stream_writer(self.raw)
+        else:
+            self.stream = self.raw
+        self.opened_at = time.monotonic()
+        self.last_flush = self.opened_at
+        self.files.append(path)
+    
+    def write(self, payload):
+        """직렬화된 이벤트 한 줄 추가 (버퍼가 차거나 flush 주기가 지나면 기록)"""
+        self.buffer.append(payload)
+        self.buffered_bytes += len(payload) + 1
+        if self.buffered_bytes >= self.buffer_size:
+            self.flush()
+        else:
+            self.poll()
+    
+    def poll(self):
+        """flush 주기가 지났으면 기록 (이벤트가 뜸할 때도 루프에서 주기적으로 호출)"""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+    
+    def _write_buffer(self):
+        if self.buffer:
+            self.buffer.append(b'')  # 마지막 줄바꿈
+            self.stream.write(b'\n'.join(self.buffer))
+            self.bytes_written += self.buffered_bytes
+            self.buffer = []
+            self.buffered_bytes = 0
+    
+    def flush(self):
+        """버퍼 내용을 파일에 기록하고 필요하면 다음 파일로 회전"""
+        self._write_buffer()
+        if self.compression == 'gzip':
+            self.stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == 'zstd':
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        self.raw.flush()
+        self.last_flush = time.monotonic()
+        
+        if ((self.rotate_bytes and self.raw.tell() >= self.rotate_bytes) or
+                (self.rotate_seconds and self.last_flush - self.opened_at >= self.rotate_seconds)):
+            self._close_current()
+            self._open_next()
+    
+    def _close_current(self):
+        self.stream.close()
+        if self.stream is not self.raw:
+            self.raw.close()
+    
+    def close(self):
+        """남은 버퍼를 모두 기록하고 압축 스트림을 마무리"""
+        self._write_buffer()
+        self._close_current()
+    
+    def describe(self):
+        """기록한 파일 목록 요약"""
+        if len(self.files) == 1:
+            return self.files[0]
+        return f"{self.files[0]} ~ {self.files[-1]} ({len(self.files)}개 파일)"
+
+
+class ParquetSink:
+    """이벤트 레코드를 열 배치로 모아 날짜·시간 파티션별 Parquet 파일로 기록
+
+    JSON을 거치지 않고 레코드 튜플과 사용자 테이블·곡 카탈로그의 코드 배열에서 바로
+    열을 만든다. 범주형·문자열 필드는 풀 인덱스를 그대로 딕셔너리 인코딩 열로 쓰고,
+    batch_size개마다 ts의 로컬 날짜·시간(date=YYYY-MM-DD/hour=HH)별로 나눠 파티션 파일에
+    row group 하나씩 추가한다. 메모리는 배치 하나 크기로 제한되며, 지난 시간대 파일은
+    새 시간대가 시작되면 닫는다. 기존 파일은 덮어쓰지 않는다.
+    """
+    
+    # 페이지별 HTTP 메소드 코드 (auth·status는 항상 같은 값)
+    METHODS = np.array([HTTP_METHOD_CODES.index(HTTP_METHODS.get(page, 'GET')) for page in PAGES], dtype=np.int32)
+    
+    def __init__(self, directory, users, songs, batch_size=PARQUET_BATCH_SIZE, compression='zstd', prefix='part'):
+        self.directory = directory
+        self.users = users
+        self.songs = songs
+        self.batch_size = batch_size
+        self.compression = compression
+        self.prefix = prefix
+        
+        self.records = []
+        self.user_rows = []
+        self.writers = {}  # 시간 구간 → ParquetWriter
+        self.files = []
+        self.rows_written = 0
+        
+        self.dictionaries = {
+            'page': pa.array(PAGES), 'auth': pa.array(AUTH_STATES[:1]), 'method': pa.array(HTTP_METHOD_CODES),
+            'level': pa.array(LEVELS), 'location': pa.array(USER_CITIES), 'userAgent': pa.array(users.user_agents),
+            'firstName': pa.array(users.first_names), 'lastName': pa.array(users.last_names),
+            'gender': pa.array(GENDERS), 'artist': pa.array(songs.artist_names), 'song': pa.array(songs.titles),
+            'artist_tier': pa.array(ARTIST_TIERS),
+        }
+        string_dictionary = pa.dictionary(pa.int32(), pa.string())
+        self.schema = pa.schema([
+            ('ts', pa.int64()), ('userId', pa.int64()), ('sessionId', pa.int64()),
+            ('page', string_dictionary), ('auth', string_dictionary), ('method', string_dictionary),
+            ('status', pa.int16()), ('level', string_dictionary), ('itemInSession', pa.int32()),
+            ('location', string_dictionary), ('userAgent', string_dictionary),
+            ('firstName', string_dictionary), ('lastName', string_dictionary),
+            ('gender', string_dictionary), ('age', pa.int16()), ('registration', pa.int64()),
+            ('artist', string_dictionary), ('song', string_dictionary), ('length', pa.int16()),
+            ('artist_tier', string_dictionary), ('song_popularity', pa.int16()),
+        ])
+    
+    def add(self, user_idx, record):
+        self.records.append(record)
+        self.user_rows.append(user_idx)
+        if len(self.records) >= self.batch_size:
+            self.flush()
+    
+    def _dictionary(self, name, codes, mask=None):
+        """풀 인덱스 배열을 이 배치에 쓰인 값만 담은 딕셔너리 열로 변환"""
+        used = codes if mask is None else codes[~mask]
+        uniques, inverse = np.unique(used, return_inverse=True)
+        indices = np.zeros(len(codes), dtype=np.int32)
+        if mask is None:
+            indices[:] = inverse
+        else:
+            indices[~mask] = inverse
+        return pa.DictionaryArray.from_arrays(pa.array(indices, mask=mask),
+                                              self.dictionaries[name].take(pa.array(uniques)))
+    
+    def _table(self, records, user_rows):
+        users = self.users
+        songs = self.songs
+        n = len(records)
+        ts = records[:, 0]
+        page = records[:, 2]
+        no_song = records[:, 4] < 0
+        song_rows = np.where(no_song, 0, records[:, 4])
+        
+        # 가입일(일 번호)은 배치에 나온 날짜만 로컬 자정 ms로 변환
+        days, day_index = np.unique(users.registration[user_rows], return_inverse=True)
+        registration = np.array([int(datetime.combine(date.fromordinal(int(day)), datetime.min.time()).timestamp())
+                                 * 1000 for day in days], dtype=np.int64)[day_index]
+        
+        columns = [
+            ts, users.user_id[user_rows].astype(np.int64), records[:, 1],
+            self._dictionary('page', page), self._dictionary('auth', np.zeros(n, dtype=np.int32)),
+            self._dictionary('method', self.METHODS[page]), np.full(n, 200, dtype=np.int16),
+            self._dictionary('level', users.level[user_rows]), records[:, 3].astype(np.int32),
+            self._dictionary('location', users.location[user_rows]),
+            self._dictionary('userAgent', users.user_agent[user_rows]),
+            self._dictionary('firstName', users.first_name[user_rows]),
+            self._dictionary('lastName', users.last_name[user_rows]),
+            self._dictionary('gender', users.gender[user_rows]), users.age[user_rows].astype(np.int16),
+            registration,
+            self._dictionary('artist', songs.artist[song_rows], no_song),
+            self._dictionary('song', songs.title[song_rows], no_song),
+            pa.array(songs.duration[song_rows].astype(np.int16), mask=no_song),
+            self._dictionary('artist_tier', songs.tier[song_rows], no_song),
+            pa.array(songs.popularity[song_rows].astype(np.int16), mask=no_song),
+        ]
+        return pa.Table.from_arrays([pa.array(column) if isinstance(column, np.ndarray) else column
+                                     for column in columns], schema=self.schema)
+    
+    def flush(self):
+        """모인 레코드를 열 배치로 변환해 시간 파티션별 파일에 기록"""
+        if not self.records:
+            return
+        records = np.array(self.records, dtype=np.int64)
+        user_rows = np.array(self.user_rows, dtype=np.intp)
+        self.records = []
+        self.user_rows = []
+        
+        hours = self._local_hours(records[:, 0])
+        if np.any(hours[1:] < hours[:-1]):
+            order = np.argsort(hours, kind='stable')
+            records, user_rows, hours = records[order], user_rows[order], hours[order]
+        table = self._table(records, user_rows)
+        
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(hours)) + 1, [len(hours)]))
+        for start, end in zip(starts[:-1], starts[1:]):
+            self._writer(int(hours[start])).write_table(table.slice(start, end - start))
+        self.rows_written += len(records)
+        
+        # 이벤트 시각은 앞으로만 가므로 이번 배치의 마지막 시간대보다 이른 파일은 닫기
+        for hour in [hour for hour in self.writers if hour < hours[-1]]:
+            self.writers.pop(hour).close()
+    
+    @staticmethod
+    def _local_hours(ts):
+        """ts(ms)별 로컬 벽시계 기준 시간 번호 (로컬 시각을 epoch처럼 센 시간 수)
+
+        UTC 오프셋은 배치에 나온 15분 구간마다 한 번만 구하므로 30·45분 단위
+        시간대와 서머타임 전환도 로컬 날짜·시간 폴더와 정확히 맞는다.
+        """
+        quarters, inverse = np.unique(ts // 900000, return_inverse=True)
+        offsets = np.array([datetime.fromtimestamp(quarter * 900).astimezone().utcoffset().total_seconds()
+                            for quarter in quarters.tolist()], dtype=np.int64) * 1000
+        return (ts + offsets[inverse]) // 3600000
+    
+    def _writer(self, hour):
+        writer = self.writers.get(hour)
+        if writer is None:
+            started = datetime(1970, 1, 1) + timedelta(hours=hour)
+            partition = os.path.join(self.directory, f"date={started:%Y-%m-%d}", f"hour={started:%H}")
+            os.makedirs(partition, exist_ok=True)
+            number = 0
+            while True:
+                path = os.path.join(partition, f"{self.prefix}-{number:05d}.parquet")
+                if not os.path.exists(path):
+                    break
+                number += 1
+            writer = pq.ParquetWriter(path, self.schema, compression=self.compression)
+            self.writers[hour] = writer
+            self.files.append(path)
+        return writer
+    
+    def close(self):
+        """남은 레코드를 기록하고 열린 파일을 모두 닫기"""
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+    
+    def describe(self):
+        """기록 결과 요약"""
+        size = sum(os.path.getsize(path) for path in self.files if os.path.exists(path))
+        return (f"{self.directory} ({len(self.files)}개 파일, {self.rows_written:,}행, "
+                f"{size / 1024 / 1024:,.1f}MB, {self.compression or '압축 없음'})")
+
+
+class SinkPipeline:
+    """생성 스레드와 싱크(Kafka, 파일)를 분리하는 큐 파이프라인
+
+    생성 스레드는 직렬화된 이벤트를 배치로 모아 싱크마다 있는 크기 제한 큐에 넣고,
+    싱크별 스레드가 큐를 비우며 기록하므로 두 싱크가 서로와 생성을 기다리지 않는다.
+    큐가 가득 차면(depth개 배치) 생성 스레드가 자리가 날 때까지 멈추며(역압),
+    이렇게 멈춘 시간은 blocked_seconds에, 싱크 스레드가 기록·flush에 쓴 시간은 sink_seconds에
+    싱크별로 누적된다. close는 큐에 남은 배치를 모두 기록한 뒤 반환한다.
+    """
+    
+    def __init__(self, kafka_sink, file_sink, depth, batch_size=PIPELINE_BATCH_SIZE):
+        self.depth = depth
+        self.batch_size = batch_size
+        self.batch = []
+        # 아직 모든 싱크 큐에 넘기지 못한 배치와 남은 싱크 이름 (대기 중 중단돼도 버리지 않음)
+        self.pending = None
+        self.queues = {}
+        self.threads = {}
+        self.error = None
+        self.blocked_seconds = 0.0
+        self.sink_seconds = {}
+        
+        if kafka_sink:
+            self._start('kafka', self._kafka_writer(kafka_sink), None, None)
+        if file_sink:
+            # 파일 싱크는 이 스레드만 만지므로 주기적 flush도 여기서 (이벤트가 뜸할 때 대비)
+            self._start('file', self._file_writer(file_sink), file_sink.poll, file_sink.flush_interval)
+    
+    @staticmethod
+    def _kafka_writer(sink):
+        def write(batch):
+            for key, _, value in batch:
+                sink.send(key, value)
+        return write
+    
+    @staticmethod
+    def _file_writer(sink):
+        def write(batch):
+            for _, payload, _ in batch:
+                sink.write(payload)
+        return write
+    
+    def _start(self, name, write, poll, poll_interval):
+        if poll_interval is not None:
+            poll_interval = max(poll_interval, PIPELINE_MIN_POLL_SECONDS)
+        sink_queue = queue.Queue(maxsize=self.depth)
+        thread = threading.Thread(target=self._drain, args=(name, sink_queue, write, poll, poll_interval),
+                                  name=f'sink-{name}', daemon=True)
+        self.sink_seconds[name] = 0.0
+        self.queues[name] = sink_queue
+        self.threads[name] = thread
+        thread.start()
+    
+    def _drain(self, name, sink_queue, write, poll, poll_interval):
+        """싱크 스레드 본문: 종료 표시(None)를 받을 때까지 배치 기록"""
+        while True:
+            try:
+                batch = sink_queue.get(timeout=poll_interval)
+            except queue.Empty:
+                batch = poll
+            if batch is None:
+                break
+            # 싱크가 실패하면(주기적 flush 포함) 이후 배치는 버리되 큐는 계속 비워 생성 스레드가 멈추지 않게 함
+            if self.error is None:
+                started = time.perf_counter()
+                try:
+                    if batch is poll:
+                        poll()
+                    else:
+                        write(batch)
+                except Exception as e:
+                    self.error = e
+                finally:
+                    # 이 싱크의 값은 이 스레드만 갱신함
+                    self.sink_seconds[name] += time.perf_counter() - started
+    
+    def _put(self, name, item):
+        """싱크 큐에 넣기 (가득 차면 대기하되, 싱크 스레드가 죽었으면 기다리지 않고 실패)"""
+        sink_queue = self.queues[name]
+        thread = self.threads[name]
+        while True:
+            try:
+                sink_queue.put(item, timeout=PIPELINE_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                if not thread.is_alive():
+                    if self.error is None:
+                        self.error = RuntimeError(f"싱크 스레드({name})가 종료되었습니다")
+                    raise self.error
+    
+    def write(self, key, payload, value):
+        self.batch.append((key, payload, value))
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """모인 배치를 모든 싱크 큐에 넘기기 (큐가 가득 차면 대기)"""
+        if self.error is not None:
+            raise self.error
+        while self.pending or self.batch:
+            if self.pending is None:
+                self.pending = (self.batch, list(self.queues))
+                self.batch = []
+            batch, names = self.pending
+            while names:
+                try:
+                    self.queues[names[0]].put_nowait(batch)
+                except queue.Full:
+                    blocked_at = time.monotonic()
+                    try:
+                        self._put(names[0], batch)
+                    finally:
+                        self.blocked_seconds += time.monotonic() - blocked_at
+                names.pop(0)
+            self.pending = None
+    
+    def queued_batches(self):
+        """싱크별 큐에서 기다리는 배치 수"""
+        return {name: sink_queue.qsize() for name, sink_queue in self.queues.items()}
+    
+    def close(self):
+        """남은 배치를 넘기고 싱크 스레드가 큐를 모두 비울 때까지 대기"""
+        if self.error is None:
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+        for name, thread in self.threads.items():
+            try:
+                self._put(name, None)
+            except Exception:
+                continue  # 이미 죽은 스레드는 기다리지 않음
+            thread.join()
+        if self.error is not None:
+            print(f"❌ 싱크 기록 실패: {self.error!r}")
+
+
+def _mix64(values, seed=0):
+    """정수 배열을 64비트 해시로 섞기 (입력에 seed를 XOR한 뒤 splitmix64 마무리 함수, 벡터 연산)"""
+    with np.errstate(over='ignore'):
+        z = (np.asarray(values).astype(np.uint64) ^ np.uint64(seed)) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+class HyperLogLog:
+    """고정 크기(2^precision 바이트) 근사 고유 개수 스케치"""
+    
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+    
+    def add(self, values):
+        hashes = _mix64(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # 나머지 비트(64-precision ≤ 52비트)는 float64로 정확히 표현되므로 frexp 지수가 곧 비트 길이
+        rest = (hashes & np.uint64((1 << (64 - self.precision)) - 1)).astype(np.float64)
+        rank = (64 - self.precision + 1 - np.frexp(rest)[1]).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+    
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+    
+    def clear(self):
+        self.registers[:] = 0
+    
+    def estimate(self):
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        # 작은 범위는 선형 계수로 보정
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class CountMinTopK:
+    """Count-Min Sketch와 크기 제한 후보 집합으로 근사 top-N 유지 (메모리 고정)"""
+    
+    def __init__(self, depth=CMS_DEPTH, width=CMS_WIDTH, candidates=TOPK_CANDIDATES):
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        # 행마다 독립적인 64비트 시드 (상수에 행 번호를 더하면 행 r의 해시가 키+r의 해시와 같아져 행끼리 상관됨)
+        self.seeds = np.random.SeedSequence(CMS_HASH_SEED).generate_state(depth, dtype=np.uint64)
+        self.shift = np.uint64(64 - (width.bit_length() - 1))
+        self.max_candidates = candidates
+        self.candidates = np.zeros(0, dtype=np.int64)
+    
+    def _columns(self, keys):
+        return [(_mix64(keys, seed) >> self.shift).astype(np.intp) for seed in self.seeds]
+    
+    def _estimate(self, keys):
+        return np.min([self.table[row, columns] for row, columns in enumerate(self._columns(keys))], axis=0)
+    
+    def add(self, keys):
+        keys, counts = np.unique(keys, return_counts=True)
+        for row, columns in enumerate(self._columns(keys)):
+            np.add.at(self.table[row], columns, counts)
+        # 기존 후보와 이번 키들 중 추정치가 큰 순서로 후보만 남김
+        candidates = np.union1d(self.candidates, keys)
+        if len(candidates) > self.max_candidates:
+            estimates = self._estimate(candidates)
+            candidates = candidates[np.argpartition(-estimates, self.max_candidates)[:self.max_candidates]]
+        self.candidates = candidates
+    
+    def clear(self):
+        self.table[:] = 0
+        self.candidates = np.zeros(0, dtype=np.int64)
+    
+    def top(self, n):
+        """추정 횟수 상위 n개 (키, 추정 횟수)"""
+        if not len(self.candidates):
+            return []
+        estimates = self._estimate(self.candidates)
+        order = np.argsort(-estimates, kind='stable')[:n]
+        return list(zip(self.candidates[order].tolist(), estimates[order].tolist()))
+
+
+class StreamAggregator:
+    """생성 중인 이벤트의 이벤트 시각 기준 텀블링 윈도 집계
+
+    윈도마다 페이지·아티스트 티어·등급별 정확한 건수, HyperLogLog 고유 사용자 수,
+    Count-Min Sketch 기반 상위 곡·아티스트를 구해 윈도가 닫힐 때 한 줄짜리 JSON으로 내보낸다.
+    레코드는 모아 두었다가 AGGREGATE_BATCH_SIZE개씩 벡터 연산으로 처리하며,
+    스케치 크기가 고정이라 연속 실행이 아무리 길어도 메모리는 늘지 않는다.
+    """
+    
+    def __init__(self, users, songs, window_seconds, output=None, label=''):
+        self.users = users
+        self.songs = songs
+        self.window_ms = int(window_seconds * 1000)
+        self.output = open(output, 'a', encoding='utf-8') if output else None
+        self.label = label
+        
+        self.records = []
+        self.user_rows = []
+        self.window_start = None
+        self.window_end = None
+        self.page_counts = np.zeros(len(PAGES), dtype=np.int64)
+        self.tier_counts = np.zeros(len(ARTIST_TIERS), dtype=np.int64)
+        self.level_counts = np.zeros(len(LEVELS), dtype=np.int64)
+        self.window_users = HyperLogLog()
+        self.total_users = HyperLogLog()
+        self.top_songs = CountMinTopK()
+        self.top_artists = CountMinTopK()
+        self.total_events = 0
+    
+    def add(self, user_idx, record):
+        """이벤트 레코드 하나 추가 (윈도 경계를 넘으면 이전 윈도를 닫고 내보냄)"""
+        ts = record[0]
+        if self.window_end is None or ts >= self.window_end:
+            self._close_window()
+            self.window_start = ts - ts % self.window_ms
+            self.window_end = self.window_start + self.window_ms
+        self.records.append(record)
+        self.user_rows.append(user_idx)
+        if len(self.records) >= AGGREGATE_BATCH_SIZE:
+            self._process()
+    
+    def _process(self):
+        """모인 레코드를 벡터 연산으로 집계에 반영"""
+        if not self.records:
+            return
+        records = np.array(self.records, dtype=np.int64)
+        user_rows = np.array(self.user_rows, dtype=np.intp)
+        self.records = []
+        self.user_rows = []
+        
+        self.page_counts += np.bincount(records[:, 2], minlength=len(PAGES))
+        self.level_counts += np.bincount(self.users.level[user_rows], minlength=len(LEVELS))
+        self.window_users.add(self.users.user_id[user_rows])
+        
+        song_rows = records[records[:, 4] >= 0, 4]
+        if len(song_rows):
+            self.tier_counts += np.bincount(self.songs.tier[song_rows], minlength=len(ARTIST_TIERS))
+            artists = self.songs.artist[song_rows].astype(np.int64)
+            # 카탈로그에는 같은 아티스트·제목의 곡이 여러 행 있으므로 (아티스트, 제목) 단위로 집계
+            self.top_songs.add(artists * len(self.songs.titles) + self.songs.title[song_rows])
+            self.top_artists.add(artists)
+        self.total_events += len(records)
+    
+    def _close_window(self, partial=False):
+        self._process()
+        events = int(self.page_counts.sum())
+        if events:
+            self.total_users.merge(self.window_users)
+            self._emit(events, partial)
+        self.page_counts[:] = 0
+        self.tier_counts[:] = 0
+        self.level_counts[:] = 0
+        self.window_users.clear()
+        self.top_songs.clear()
+        self.top_artists.clear()
+    
+    def _emit(self, events, partial):
+        songs = self.songs
+        title_count = len(songs.titles)
+        summary = {
+            'window_start': datetime.fromtimestamp(self.window_start / 1000).isoformat(),
+            'window_seconds': self.window_ms / 1000,
+            'events': events,
+            'pages': {page: int(count) for page, count in zip(PAGES, self.page_counts) if count},
+            'artist_tiers': {tier: int(count) for tier, count in zip(ARTIST_TIERS, self.tier_counts)},
+            'levels': {level: int(count) for level, count in zip(LEVELS, self.level_counts)},
+            'distinct_users': self.window_users.estimate(),
+            'top_songs': [[songs.artist_names[key // title_count], songs.titles[key % title_count], plays]
+                          for key, plays in self.top_songs.top(AGGREGATE_TOP_N)],
+            'top_artists': [[songs.artist_names[artist], plays]
+                            for artist, plays in self.top_artists.top(AGGREGATE_TOP_N)],
+            'total_events': self.total_events,
+            'total_distinct_users': self.total_users.estimate(),
+        }
+        if partial:
+            summary['partial'] = True
+        line = json.dumps(summary, ensure_ascii=False, separators=(',', ':'))
+        if self.output:
+            self.output.write(line + '\n')
+            self.output.flush()
+        else:
+            print(f"{self.label}{line}")
+    
+    def close(self):
+        """진행 중인 윈도를 부분 윈도로 내보내고 종료"""
+        self._close_window(partial=True)
+        if self.output:
+            self.output.close()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # 스크레이프마다 콘솔에 접속 로그를 남기지 않음
+
+
+class ProducerMetrics:
+    """Prometheus 텍스트 형식 메트릭 엔드포인트 (--metrics-port)
+
+    생성 단계별 소요 시간은 시뮬레이터의 단계 메서드(활동 추첨, 곡 선택, 이벤트 구성,
+    직렬화, 싱크 기록)를 시간 측정 래퍼로 바꿔 끼워 누적하므로, 메트릭을 켜지 않은
+    실행에는 비용이 전혀 없다. Kafka·파일 통계는 스크레이프할 때 싱크에서 바로 읽는다.
+    """
+    
+    STAGES = ('activity_sampling', 'song_selection', 'event_build', 'serialization', 'sink_write')
+    # 파이프라인 모드에서 생성 스레드가 싱크 큐에 넘기는 데 쓴 시간 (기록 자체는 싱크 스레드에서 측정)
+    PIPELINE_STAGES = STAGES + ('sink_handoff',)
+    
+    def __init__(self, simulator, port):
+        self.simulator = simulator
+        self.page_events = [0] * len(PAGES)
+        self.active_users = 0
+        self.stage_seconds = dict.fromkeys(self.PIPELINE_STAGES if simulator.pipeline else self.STAGES, 0.0)
+        self._instrument(simulator)
+        
+        self.server = ThreadingHTTPServer(('', port), _MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.server.metrics = self
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+    
+    def _timed(self, stage, fn):
+        seconds = self.stage_seconds
+        clock = time.perf_counter
+        
+        def timed_call(*args):
+            started = clock()
+            try:
+                return fn(*args)
+            finally:
+                seconds[stage] += clock() - started
+        return timed_call
+    
+    def _instrument(self, simulator):
+        """단계 메서드를 인스턴스 속성으로 덮어써 측정 (이벤트 구성 시간은 곡 선택을 포함해 누적)"""
+        simulator._sample_active_users = self._timed('activity_sampling', simulator._sample_active_users)
+        simulator._next_session_time = self._timed('activity_sampling', simulator._next_session_time)
+        simulator._select_song = self._timed('song_selection', simulator._select_song)
+        simulator._step_sessions = self._timed('event_build', simulator._step_sessions)
+        simulator._advance_session = self._timed('event_build', simulator._advance_session)
+        simulator.encoder.encode = self._timed('serialization', simulator.encoder.encode)
+        if simulator.kafka_encoder:
+            simulator.kafka_encoder.encode = self._timed('serialization', simulator.kafka_encoder.encode)
+        simulator._write_payload = self._timed('sink_handoff' if simulator.pipeline else 'sink_write',
+                                               simulator._write_payload)
+        
+        emit_record = simulator._emit_record
+        page_events = self.page_events
+        
+        def counted_emit(user_idx, record, active_count):
+            page_events[record[2]] += 1
+            self.active_users = active_count
+            emit_record(user_idx, record, active_count)
+        simulator._emit_record = counted_emit
+    
+    def render(self):
+        simulator = self.simulator
+        lines = []
+        
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP music_producer_{name} {help_text}")
+            lines.append(f"# TYPE music_producer_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"music_producer_{name}{labels} {value}")
+        
+        metric('events_total', 'counter', '페이지 유형별 생성 이벤트 수',
+               [(f'{{page="{page}"}}', count) for page, count in zip(PAGES, self.page_events)])
+        metric('active_users', 'gauge', '현재 활성 사용자 수 (콘솔 진행 로그와 같은 기준)',
+               [('', self.active_users)])
+        metric('open_sessions', 'gauge', '진행 중인 세션 수', [('', simulator.sessions.open_sessions)])
+        
+        # 곡 선택은 이벤트 구성 안에서 호출되므로 이벤트 구성 시간에서 빼서 단계끼리 겹치지 않게 함
+        stage_seconds = dict(self.stage_seconds)
+        stage_seconds['event_build'] -= stage_seconds['song_selection']
+        if simulator.pipeline:
+            stage_seconds['sink_write'] = sum(simulator.pipeline.sink_seconds.values())
+        metric('stage_seconds_total', 'counter', '생성 단계별 누적 소요 시간 (초)',
+               [(f'{{stage="{stage}"}}', f"{seconds:.6f}") for stage, seconds in stage_seconds.items()])
+        
+        if simulator.kafka_sink:
+            sink = simulator.kafka_sink
+            sent, delivered, errors, latency_sum, latency_max = sink.stats()
+            metric('kafka_messages_total', 'counter', 'Kafka 전송 결과별 메시지 수',
+                   [('{result="sent"}', sent), ('{result="delivered"}', delivered), ('{result="failed"}', errors)])
+            metric('kafka_in_flight', 'gauge', '브로커 응답을 기다리는 메시지 수',
+                   [('', sink.pending())])
+            metric('kafka_send_latency_seconds', 'summary', 'Kafka 전송부터 브로커 확인까지 걸린 시간',
+                   [('_sum', f"{latency_sum:.6f}"), ('_count', delivered)])
+            metric('kafka_send_latency_max_seconds', 'gauge', 'Kafka 전송 지연 최댓값',
+                   [('', f"{latency_max:.6f}")])
+            metric('kafka_backpressure_seconds_total', 'counter', 'in-flight 상한 때문에 생성이 멈춘 시간',
+                   [('', f"{sink.blocked_seconds:.6f}")])
+        
+        if simulator.file_sink:
+            metric('file_bytes_written_total', 'counter', 'JSON 파일에 기록한 바이트 수 (압축 전)',
+                   [('', simulator.file_sink.bytes_written)])
+            metric('file_files_total', 'counter', '회전 포함 생성한 JSON 파일 수',
+                   [('', len(simulator.file_sink.files))])
+        
+        if simulator.pipeline:
+            metric('pipeline_queued_batches', 'gauge', '싱크별 큐에서 기다리는 배치 수',
+                   [(f'{{sink="{name}"}}', size) for name, size in simulator.pipeline.queued_batches().items()])
+            metric('pipeline_blocked_seconds_total', 'counter', '싱크 큐가 가득 차서 생성이 멈춘 시간',
+                   [('', f"{simulator.pipeline.blocked_seconds:.6f}")])
+            metric('pipeline_sink_seconds_total', 'counter', '싱크 스레드가 기록·flush에 쓴 시간',
+                   [(f'{{sink="{name}"}}', f"{seconds:.6f}")
+                    for name, seconds in simulator.pipeline.sink_seconds.items()])
+        
+        if simulator.pacer:
+            metric('target_events_per_second', 'gauge', '목표 초당 이벤트 수',
+                   [('', simulator.pacer.target_rate)])
+        
+        return '\n'.join(lines) + '\n'
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
 
 class RealisticMusicStreamingSimulator:
-    def __init__(self, kafka_brokers=None, topic_name=None, num_users=100, output_file=None):
+    def __init__(self, kafka_brokers=None, topic_name=None, num_users=100, output_file=None,
+                 seed=None, snapshot_dir=None, reference_date=None, worker=None, kafka_options=None,
+                 file_options=None, metrics_port=None, catalog_scale=1.0, song_weighting='popularity',
+                 aggregate_window=None, aggregate_output=None, kafka_encoding='json',
+                 parquet_dir=None, parquet_options=None):
         self.kafka_brokers = kafka_brokers
         self.topic_name = topic_name
         self.num_users = num_users
         self.output_file = output_file
+        self.seed = seed
+        # 아티스트 수(메가스타 제외) 배율. 곡 수도 거의 비례해서 줄거나 늘어남
+        self.catalog_scale = catalog_scale
+        # 버킷 안에서 곡을 고르는 방식 ('popularity': 인기도×재생 횟수 가중, 'uniform': 균등)
+        self.song_weighting = song_weighting
+        # 가입일 생성 기준일 (백필 시 시작일로 고정해 날짜와 무관하게 같은 데이터가 나오게 함)
+        self.reference_date = reference_date
         self.fake = Faker()
+        self.clock = WallClock()
+        # 멀티 프로세스 모드의 (워커 번호, 워커 수, 파티션 수). 워커는 자기 파티션의 사용자만 맡음
+        self.worker = worker
+        self.log_prefix = f"[w{worker[0]}] " if worker else ''
+        self.metrics_port = metrics_port
+        # 스트리밍 집계 윈도 길이(초, 이벤트 시각 기준)와 요약 JSON 출력 파일 (없으면 콘솔)
+        self.aggregate_window = aggregate_window
+        self.aggregate_output = aggregate_output
+        
+        # 시드가 주어지면 같은 데이터가 생성되도록 모든 난수 생성기 고정
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+            self.fake.seed_instance(seed)
         
         # Kafka Producer 설정
-        self.producer = None
+        self.kafka_sink = None
         if kafka_brokers and topic_name:
-            self.producer = KafkaProducer(
-                bootstrap_servers=kafka_brokers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                key_serializer=lambda k: str(k).encode('utf-8')
-            )
+            self.kafka_sink = KafkaSink(kafka_brokers, topic_name, **(kafka_options or {}))
         
-        # JSON 파일 출력 설정
-        self.json_output = None
+        # JSON 파일 출력 설정 (직렬화된 UTF-8 bytes를 버퍼에 모아 기록)
+        self.file_sink = None
         if output_file:
-            self.json_output = open(output_file, 'w', encoding='utf-8')
+            self.file_sink = FileSink(output_file, **(file_options or {}))
+        # 싱크 스레드 파이프라인 (start_streaming에서 구성, 없으면 바로 기록)
+        self.pipeline = None
+        # 스트리밍 집계 (start_streaming에서 구성)
+        self.aggregator = None
+        
+        # 현실적인 대규모 음악 데이터베이스 구성 (스냅샷이 있으면 생성 대신 열기)
+        self.snapshot_path = self._snapshot_path(snapshot_dir) if snapshot_dir else None
+        # 세션 ID는 워커마다 다른 시작값에서 워커 수 간격으로 증가해 전체에서 겹치지 않음
+        self.session_counter = worker[0] + 1 if worker else 1
+        self.session_step = worker[1] if worker else 1
+        if self.snapshot_path and os.path.exists(os.path.join(self.snapshot_path, 'meta.json')):
+            self._load_snapshot()
+        else:
+            print("🎼 대규모 음악 데이터베이스 생성 중... (실제 음원 서비스처럼)")
+            self.artists = self._generate_realistic_artists()
+            self.songs = self._generate_massive_song_database()
+            self.users = self._generate_users()
+            if self.snapshot_path:
+                self._save_world_snapshot()
+        
+        if worker:
+            self._take_user_shard()
+        
+        # 진행 중인 세션 (스냅샷에 체크포인트가 있으면 이어서 진행)
+        self.sessions = SessionTable(len(self.users))
+        self.user_positions = None
+        if self.snapshot_path:
+            self._load_session_snapshot()
         
-        # 현실적인 대규모 음악 데이터베이스 구성
-        print("🎼 대규모 음악 데이터베이스 생성 중... (실제 음원 서비스처럼)")
-        self.artists = self._generate_realistic_artists()
-        self.songs = self._generate_massive_song_database()
-        self.users = self._generate_users()
-        self.user_sessions = {}
+        self.song_index = self._build_song_index()
+        self.song_tables = self._build_song_tables() if song_weighting == 'popularity' else None
+        self.encoder = JsonEventEncoder(self.users, self.songs)
+        # Kafka 메시지를 바이너리 스키마로 보낼 때의 인코더 (JSON이면 파일과 같은 payload 사용)
+        self.kafka_encoder = BinaryEventEncoder(self.users, self.songs) if kafka_encoding == 'binary' else None
+        # 열 단위 Parquet 출력 (JSON 인코딩 없이 레코드에서 바로 열 배치 구성)
+        self.parquet_sink = None
+        if parquet_dir:
+            self.parquet_sink = ParquetSink(parquet_dir, self.users, self.songs, **(parquet_options or {}))
+        
+        # 틱마다 활성 사용자를 한 번에 뽑기 위한 활동 확률 표와 사용자 속성 코드 배열
+        self.activity_table = self._build_activity_table()
+        self.user_activity = np.array(self.users.activity_level, dtype=np.uint8)
+        self.user_age_group = np.array(self.users.age_group, dtype=np.uint8)
         
         # 더 세밀한 상태 전이 확률
         self.state_transitions = {
@@ -52,6 +1828,7 @@ class RealisticMusicStreamingSimulator:
             'Login': {'Home': 1.0},
             'Register': {'Home': 1.0}
         }
+        self.transition_cdf = self._compile_transitions()
         
     def _generate_realistic_artists(self):
         """현실적인 대규모 아티스트 데이터베이스 생성"""
@@ -71,7 +1848,7 @@ class RealisticMusicStreamingSimulator:
         
         # 톱스타급 (차트 상위권) - 소수
         top_stars = []
-        for i in range(50):
+        for i in range(round(50 * self.catalog_scale)):
             top_stars.append({
                 'name': f'TopStar_{i+1}',
                 'popularity': random.randint(75, 91),
@@ -81,7 +1858,7 @@ class RealisticMusicStreamingSimulator:
         
         # 유명 아티스트급 (일반적으로 알려진) - 중간 규모
         famous_artists = []
-        for i in range(500):
+        for i in range(round(500 * self.catalog_scale)):
             famous_artists.append({
                 'name': f'Famous_{i+1}',
                 'popularity': random.randint(50, 74),
@@ -91,7 +1868,7 @@ class RealisticMusicStreamingSimulator:
         
         # 신인/인디 아티스트급 (대부분) - 대규모
         indie_artists = []
-        for i in range(10000):  # 10,000명의 인디 아티스트
+        for i in range(round(10000 * self.catalog_scale)):  # 10,000명의 인디 아티스트
             indie_artists.append({
                 'name': f'Indie_{i+1}',
                 'popularity': random.randint(1, 49),
@@ -104,227 +1881,312 @@ class RealisticMusicStreamingSimulator:
         return artists
     
     def _generate_massive_song_database(self):
-        """현실적인 대규모 곡 데이터베이스 생성 (수백만 곡)"""
-        songs = []
-        song_id = 1
-        
-        # 노래 제목 구성 요소들
-        title_words = [
-            'Love', 'Heart', 'Dream', 'Night', 'Day', 'Fire', 'Rain', 'Dance', 'Time', 'Life',
-            'Soul', 'Star', 'Moon', 'Sun', 'Light', 'Dark', 'Blue', 'Red', 'Gold', 'Silver',
-            'Beautiful', 'Perfect', 'Forever', 'Never', 'Always', 'Tonight', 'Yesterday', 'Tomorrow',
-            'Angel', 'Heaven', 'Paradise', 'Ocean', 'Mountain', 'River', 'Wind', 'Storm',
-            'Freedom', 'Journey', 'Adventure', 'Memory', 'Story', 'Magic', 'Wonder', 'Miracle'
-        ]
-        
-        for artist in self.artists:
-            # 아티스트 티어에 따른 곡 수 결정
-            if artist['tier'] == 'mega':
-                num_songs = random.randint(200, 500)  # 메가스타는 많은 곡
-            elif artist['tier'] == 'top':
-                num_songs = random.randint(80, 200)   # 톱스타는 중간 정도
-            elif artist['tier'] == 'famous':
-                num_songs = random.randint(20, 80)    # 유명 아티스트는 적당히
-            else:  # indie
-                num_songs = random.randint(5, 30)     # 인디는 적게
-            
-            for i in range(num_songs):
-                # 곡 제목 생성 (더 다양하게)
-                if random.random() < 0.3:
-                    title = f"{random.choice(title_words)} {random.choice(title_words)}"
-                elif random.random() < 0.5:
-                    title = f"{random.choice(title_words)} in {random.choice(['Tokyo', 'Paris', 'LA', 'Seoul', 'London'])}"
-                elif random.random() < 0.7:
-                    title = f"{random.choice(['My', 'Your', 'Our', 'The'])} {random.choice(title_words)}"
-                else:
-                    title = f"{random.choice(title_words)} {random.randint(1, 100)}"
-                
-                # 아티스트 인기도에 따른 곡 인기도 조정
-                base_popularity = artist['popularity']
-                song_popularity = max(1, min(100, base_popularity + random.randint(-15, 15)))
-                
-                # 장르는 아티스트의 주 장르에서 선택
-                genre = random.choice(artist['genres'])
-                
-                # 발매 연도 (인기 아티스트는 최근 곡도 많이)
-                if artist['tier'] in ['mega', 'top']:
-                    year = random.randint(2015, 2024)  # 최근 위주
-                elif artist['tier'] == 'famous':
-                    year = random.randint(2010, 2024)  # 중간
-                else:
-                    year = random.randint(2000, 2024)  # 전체 범위
-                
-                song = {
-                    'song_id': f'TR_{song_id:08d}',
-                    'title': title,
-                    'artist': artist['name'],
-                    'artist_popularity': artist['popularity'],
-                    'artist_tier': artist['tier'],
-                    'album': f"{artist['name']} - Album {random.randint(1, 20)}",
-                    'genre': genre,
-                    'duration': random.randint(90, 420),  # 1.5분~7분
-                    'year': year,
-                    'popularity': song_popularity,
-                    'play_count': random.randint(100, 10000000),  # 재생 횟수
-                    'likes': random.randint(10, 500000),  # 좋아요 수
-                }
-                songs.append(song)
-                song_id += 1
-        
+        """현실적인 대규모 곡 데이터베이스 생성 (열 단위 카탈로그)"""
+        songs = SongCatalog.generate(self.artists)
         print(f"🎵 {len(songs):,}곡의 음악 데이터베이스 생성됨")
-        
-        # 인기도별로 정렬하여 차트 효과 구현
-        songs.sort(key=lambda x: x['popularity'], reverse=True)
-        
         return songs
     
     def _generate_users(self):
-        """더 현실적인 사용자 데이터 생성"""
-        users = []
-        
-        # 실제 주요 도시들
-        major_cities = [
-            'Seoul, KR', 'Tokyo, JP', 'New York, NY', 'Los Angeles, CA', 'London, UK',
-            'Paris, FR', 'Berlin, DE', 'Sydney, AU', 'Toronto, CA', 'Amsterdam, NL',
-            'Stockholm, SE', 'Copenhagen, DK', 'Mumbai, IN', 'Shanghai, CN', 'São Paulo, BR'
-        ]
+        """더 현실적인 사용자 데이터 생성 (열 단위 사용자 테이블)"""
+        users = UserTable.generate(self.num_users, self.fake, self.reference_date)
+        print(f"👥 {len(users):,}명의 사용자 생성됨")
+        return users
+    
+    def _snapshot_path(self, snapshot_dir):
+        """시드와 생성 파라미터로 구분되는 스냅샷 디렉터리 경로"""
+        seed = 'none' if self.seed is None else self.seed
+        name = f'world-v{SNAPSHOT_VERSION}-seed{seed}-users{self.num_users}'
+        if self.catalog_scale != 1.0:
+            name += f'-catalog{self.catalog_scale:g}'
+        # 가입일은 기준 날짜(--start)로부터 거꾸로 생성되므로 백필 시작일이 다르면 다른 월드
+        if self.reference_date:
+            name += f'-ref{self.reference_date:%Y%m%d}'
+        return os.path.join(snapshot_dir, name)
+    
+    def _save_world_snapshot(self):
+        """생성된 아티스트·곡 카탈로그·사용자를 스냅샷으로 저장"""
+        self.songs.save(os.path.join(self.snapshot_path, 'catalog'))
+        self.users.save(os.path.join(self.snapshot_path, 'users'))
+        with open(os.path.join(self.snapshot_path, 'world.json'), 'w', encoding='utf-8') as f:
+            json.dump({'artists': self.artists}, f, ensure_ascii=False)
         
-        # 연령대별 음악 취향
-        age_genre_preferences = {
-            'teen': ['Pop', 'Hip-Hop', 'K-Pop', 'Electronic'],
-            'young_adult': ['Pop', 'Hip-Hop', 'R&B', 'Electronic', 'Alternative'],
-            'adult': ['Pop', 'Rock', 'R&B', 'Country', 'Folk'],
-            'senior': ['Rock', 'Jazz', 'Country', 'Folk', 'Classical']
+        # meta.json은 마지막에 써서, 중간에 죽은 스냅샷은 완성된 것으로 보지 않음
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'seed': self.seed,
+            'num_users': self.num_users,
+            'catalog_scale': self.catalog_scale,
+            'reference_date': self.reference_date.isoformat() if self.reference_date else None,
+            'num_songs': len(self.songs),
+            'created': datetime.now().isoformat(),
         }
+        with open(os.path.join(self.snapshot_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        print(f"💾 스냅샷 저장됨: {self.snapshot_path}")
+    
+    def _load_snapshot(self):
+        """스냅샷에서 카탈로그·사용자(메모리 매핑)와 아티스트 복원"""
+        self.songs = SongCatalog.load(os.path.join(self.snapshot_path, 'catalog'))
+        self.users = UserTable.load(os.path.join(self.snapshot_path, 'users'))
         
-        for i in range(self.num_users):
-            # 연령대 결정 (실제 음원 서비스 사용자 분포 반영)
-            age_group_rand = random.random()
-            if age_group_rand < 0.3:  # 30% - 10대
-                age_group = 'teen'
-                age = random.randint(13, 19)
-            elif age_group_rand < 0.6:  # 30% - 20-30대
-                age_group = 'young_adult'
-                age = random.randint(20, 35)
-            elif age_group_rand < 0.85:  # 25% - 40-50대
-                age_group = 'adult'
-                age = random.randint(36, 55)
-            else:  # 15% - 60대+
-                age_group = 'senior'
-                age = random.randint(56, 75)
-            
-            # 유료 사용자 비율 (연령대별로 다름)
-            if age_group in ['young_adult', 'adult']:
-                is_paid = random.random() < 0.35  # 35%
-            elif age_group == 'teen':
-                is_paid = random.random() < 0.15  # 15%
-            else:  # senior
-                is_paid = random.random() < 0.25  # 25%
-            
-            user = {
-                'user_id': i + 1,
-                'first_name': self.fake.first_name(),
-                'last_name': self.fake.last_name(),
-                'gender': random.choice(['M', 'F']),
-                'age': age,
-                'age_group': age_group,
-                'level': 'paid' if is_paid else 'free',
-                'location': random.choice(major_cities),
-                'user_agent': self.fake.user_agent(),
-                'registration': self.fake.date_between(start_date='-5y', end_date='today'),
-                'favorite_genres': random.sample(age_genre_preferences[age_group], 2),
-                'music_taste': random.choice(['mainstream', 'indie', 'mixed']),  # 음악 취향
-                'activity_level': random.choice(['low', 'medium', 'high']),  # 활동 수준
-            }
-            users.append(user)
+        with open(os.path.join(self.snapshot_path, 'world.json'), encoding='utf-8') as f:
+            world = json.load(f)
+        self.artists = world['artists']
         
-        print(f"👥 {len(users):,}명의 사용자 생성됨")
-        return users
+        print(f"📂 스냅샷 열기: {self.snapshot_path}")
+        print(f"   - 아티스트 {len(self.artists):,}명, 곡 {len(self.songs):,}곡, 사용자 {len(self.users):,}명")
     
-    def _select_song_intelligently(self, user):
-        """사용자의 취향과 실제 음원 서비스 알고리즘을 반영한 노래 선택"""
+    def _take_user_shard(self):
+        """프로듀서와 같은 키 해시로 사용자 파티션을 구해 이 워커 몫의 사용자만 남김"""
+        worker_index, num_workers, num_partitions = self.worker
+        partitions = np.array([user_partition(user_id, num_partitions) for user_id in self.users.user_id.tolist()])
+        self.users = self.users.take(np.flatnonzero(partitions % num_workers == worker_index))
         
-        # 차트 상위권 곡들 (전체의 1%)
-        chart_songs = self.songs[:len(self.songs)//100]
+        # 워커마다 다른 이벤트 난수열 (시드가 있으면 워커 번호까지 고정)
+        if self.seed is not None:
+            random.seed(f'{self.seed}-{worker_index}')
+            np.random.seed([self.seed, worker_index])
+        print(f"{self.log_prefix}🧩 파티션 {num_partitions}개 중 "
+              f"{worker_index}번 워커 몫 사용자 {len(self.users):,}명")
+    
+    def _sessions_file(self):
+        """세션 체크포인트 파일 경로 (워커마다 따로 저장)"""
+        if self.worker:
+            worker_index, num_workers, _ = self.worker
+            return os.path.join(self.snapshot_path, f'sessions-w{worker_index}of{num_workers}.npz')
+        return os.path.join(self.snapshot_path, 'sessions.npz')
+    
+    def _load_session_snapshot(self):
+        """체크포인트된 세션 상태와 세션 ID 카운터 복원"""
+        sessions_file = self._sessions_file()
+        if not os.path.exists(sessions_file):
+            return
+        with np.load(sessions_file) as state:
+            self.session_counter = int(state['session_counter'])
+            self.sessions.restore(state, self.users.user_id)
+        print(f"{self.log_prefix}▶️  진행 중인 세션 {self.sessions.open_sessions:,}개 이어서 진행")
+    
+    def _save_session_snapshot(self):
+        """진행 중인 세션 상태를 스냅샷에 체크포인트 (임시 파일에 쓴 뒤 교체)"""
+        state = self.sessions.export(self.users.user_id)
+        sessions_file = self._sessions_file()
+        with open(sessions_file + '.tmp', 'wb') as f:
+            np.savez(f, session_counter=self.session_counter, **state)
+        os.replace(sessions_file + '.tmp', sessions_file)
+    
+    def _user_position_map(self):
+        """userId → 사용자 위치 매핑 (처음 필요할 때 한 번 만듦)"""
+        if self.user_positions is None:
+            self.user_positions = {user_id: i for i, user_id in enumerate(self.users.user_id.tolist())}
+        return self.user_positions
+    
+    def _build_song_index(self):
+        """곡 선택용 인덱스 구성 (장르·티어·차트 구간별 곡 위치 배열)
+
+        곡 데이터베이스 생성 후 한 번만 만들어 두고, 이벤트마다 전체 곡을
+        훑는 대신 인덱스 배열에서 바로 뽑는다.
+        """
+        by_genre = {GENRES[code]: np.flatnonzero(self.songs.genre == code).astype(np.int32)
+                    for code in np.unique(self.songs.genre)}
+        by_tier = {ARTIST_TIERS[code]: np.flatnonzero(self.songs.tier == code).astype(np.int32)
+                   for code in np.unique(self.songs.tier)}
         
-        # 사용자 취향 맞는 곡들
-        preference_songs = [
-            s for s in self.songs 
-            if s['genre'] in user['favorite_genres']
-        ]
+        song_index = {
+            'genre': by_genre,
+            'tier': by_tier,
+            # 차트 상위권 곡들 (인기도 정렬 기준 전체의 1%)
+            'chart': np.arange(len(self.songs) // 100, dtype=np.int32),
+        }
+        print(f"🗂️  곡 인덱스 생성됨 (장르 {len(by_genre)}개, 티어 {len(by_tier)}개)")
+        return song_index
+    
+    def _build_song_tables(self):
+        """선택 버킷(장르별, 인디, 차트, 전체)마다 인기도×재생 횟수 가중 별칭 테이블 구성"""
+        weights = self.songs.popularity.astype(np.float64) * self.songs.play_count
+        
+        def table(rows):
+            return AliasTable(rows, weights[rows]) if len(rows) else None
+        
+        song_tables = {
+            'genre': {genre: table(rows) for genre, rows in self.song_index['genre'].items()},
+            'indie': table(self.song_index['tier'].get('indie', np.zeros(0, dtype=np.int32))),
+            'chart': table(self.song_index['chart']),
+            'random': table(np.arange(len(self.songs), dtype=np.int32)),
+        }
+        print("⚖️  인기도×재생 횟수 가중 별칭 테이블 생성됨")
+        return song_tables
+    
+    def _random_song(self, *buckets):
+        """인덱스 버킷들의 합집합에서 균등하게 한 곡의 행 번호 선택 (비어 있으면 전체에서 선택)"""
+        total = sum(len(bucket) for bucket in buckets)
+        if not total:
+            return random.randrange(len(self.songs))
         
-        # 선택 알고리즘
+        pick = random.randrange(total)
+        for bucket in buckets:
+            if pick < len(bucket):
+                return int(bucket[pick])
+            pick -= len(bucket)
+    
+    def _select_song_intelligently(self, user):
+        """사용자의 취향과 실제 음원 서비스 알고리즘을 반영한 노래 선택 (카탈로그 행 번호 반환)"""
+        return self._select_song(user['music_taste'], user['favorite_genres'])
+    
+    def _select_song(self, music_taste, favorite_genres):
+        """음악 취향·선호 장르로 노래 선택 (이벤트 생성 중에는 사용자 dict 없이 바로 호출)"""
+        
+        # 선택 알고리즘: 차트 상위곡(전체의 1%), 취향 맞는 곡, 인디 아티스트 곡, 랜덤 중 어디서 고를지 결정
         selection_rand = random.random()
         
-        if user['music_taste'] == 'mainstream':
+        if music_taste == 'mainstream':
             if selection_rand < 0.6:  # 60% - 차트 상위곡
-                return random.choice(chart_songs) if chart_songs else random.choice(self.songs)
+                source = 'chart'
             elif selection_rand < 0.9:  # 30% - 취향 맞는 곡
-                return random.choice(preference_songs) if preference_songs else random.choice(self.songs)
+                source = 'preference'
             else:  # 10% - 랜덤
-                return random.choice(self.songs)
+                source = 'random'
                 
-        elif user['music_taste'] == 'indie':
+        elif music_taste == 'indie':
             if selection_rand < 0.5:  # 50% - 인디 아티스트 곡
-                indie_songs = [s for s in self.songs if s['artist_tier'] == 'indie']
-                return random.choice(indie_songs) if indie_songs else random.choice(self.songs)
+                source = 'indie'
             elif selection_rand < 0.8:  # 30% - 취향 맞는 곡
-                return random.choice(preference_songs) if preference_songs else random.choice(self.songs)
+                source = 'preference'
             else:  # 20% - 랜덤
-                return random.choice(self.songs)
+                source = 'random'
                 
         else:  # mixed
             if selection_rand < 0.3:  # 30% - 차트곡
-                return random.choice(chart_songs) if chart_songs else random.choice(self.songs)
+                source = 'chart'
             elif selection_rand < 0.6:  # 30% - 취향곡
-                return random.choice(preference_songs) if preference_songs else random.choice(self.songs)
+                source = 'preference'
             elif selection_rand < 0.8:  # 20% - 인디곡
-                indie_songs = [s for s in self.songs if s['artist_tier'] == 'indie']
-                return random.choice(indie_songs) if indie_songs else random.choice(self.songs)
+                source = 'indie'
             else:  # 20% - 랜덤
-                return random.choice(self.songs)
+                source = 'random'
+        
+        if self.song_tables:
+            return self._weighted_song(source, favorite_genres)
+        return self._uniform_song(source, favorite_genres)
+    
+    def _uniform_song(self, source, favorite_genres):
+        """고른 버킷 안에서 균등하게 한 곡 선택"""
+        if source == 'random':
+            return random.randrange(len(self.songs))
+        if source == 'preference':
+            # 사용자 취향 맞는 곡들 (곡마다 장르가 하나이므로 장르 버킷들은 서로 겹치지 않음)
+            return self._random_song(*[
+                self.song_index['genre'][genre]
+                for genre in favorite_genres
+                if genre in self.song_index['genre']
+            ])
+        if source == 'indie':
+            return self._random_song(self.song_index['tier'].get('indie', ()))
+        return self._random_song(self.song_index['chart'])
+    
+    def _weighted_song(self, source, favorite_genres):
+        """고른 버킷 안에서 인기도×재생 횟수에 비례해 한 곡 선택 (별칭 테이블, O(1))"""
+        if source == 'preference':
+            tables = [self.song_tables['genre'][genre] for genre in favorite_genres
+                      if self.song_tables['genre'].get(genre)]
+            # 취향 장르가 여러 개면 장르 버킷의 가중치 합에 비례해 장르부터 고름
+            if len(tables) > 1:
+                pick = random.random() * sum(table.total for table in tables)
+                for table in tables:
+                    pick -= table.total
+                    if pick < 0:
+                        return table.sample()
+            if tables:
+                return tables[-1].sample()
+            source = 'random'
+        
+        table = self.song_tables[source] or self.song_tables['random']
+        return table.sample()
+    
+    def _compile_transitions(self):
+        """상태 전이 확률을 누적 확률 행렬로 한 번만 변환 (행: 현재 페이지, 열: 다음 페이지)"""
+        matrix = np.zeros((len(PAGES), len(PAGES)))
+        for page, code in PAGE_CODES.items():
+            # 전이 정의가 없는 페이지(Logout 등)는 Home으로
+            for next_page, probability in self.state_transitions.get(page, {'Home': 1.0}).items():
+                matrix[code, PAGE_CODES[next_page]] = probability
+        
+        cdf = np.cumsum(matrix, axis=1)
+        cdf /= cdf[:, -1:]
+        cdf[:, -1] = 1.0  # 부동소수점 오차로 마지막 구간이 비지 않도록
+        return cdf
     
     def _get_next_action(self, current_page):
         """현재 페이지에서 다음 액션 결정"""
-        if current_page not in self.state_transitions:
+        if current_page not in PAGE_CODES:
             return 'Home'
         
-        actions = list(self.state_transitions[current_page].keys())
-        probabilities = list(self.state_transitions[current_page].values())
-        
-        return np.random.choice(actions, p=probabilities)
+        row = self.transition_cdf[PAGE_CODES[current_page]]
+        return PAGES[np.searchsorted(row, random.random(), side='right')]
+    
+    def _step_sessions(self, page_codes):
+        """여러 세션의 현재 페이지 코드 배열을 한 번의 벡터 추첨으로 다음 페이지 코드로 전이"""
+        draws = np.random.random(len(page_codes))
+        next_codes = (self.transition_cdf[page_codes] <= draws[:, None]).sum(axis=1)
+        return np.minimum(next_codes, len(PAGES) - 1)
     
-    def _generate_event(self, user, session_id, current_time):
-        """단일 이벤트 생성"""
-        if user['user_id'] not in self.user_sessions:
+    def _advance_session(self, user_idx, session_id, current_time, next_page=None):
+        """세션을 한 단계 진행하고 이벤트 레코드 반환
+
+        레코드는 (ts(ms), sessionId, 페이지 코드, itemInSession, 곡 행 번호) 튜플이며
+        NextSong이 아니면 곡 행 번호는 -1이다. next_page(페이지 코드)가 없으면
+        상태 기계에서 직접 추첨한다.
+        """
+        sessions = self.sessions
+        now_ts = current_time.timestamp()
+        if sessions.page[user_idx] < 0:
             # 새 세션 시작
-            self.user_sessions[user['user_id']] = {
-                'session_id': session_id,
-                'current_page': 'Home',
-                'current_song': None,
-                'session_start': current_time,
-                'item_in_session': 0,
-                'songs_played': [],
-                'session_duration': random.randint(300, 7200)  # 5분~2시간
-            }
-        
-        session = self.user_sessions[user['user_id']]
-        session['item_in_session'] += 1
+            sessions.open(user_idx, session_id, now_ts, random.randint(300, 7200))  # 5분~2시간
+        
+        item_in_session = int(sessions.items[user_idx]) + 1
+        sessions.items[user_idx] = item_in_session
         
         # 다음 액션 결정
-        next_action = self._get_next_action(session['current_page'])
+        if next_page is None:
+            next_page = PAGE_CODES[self._get_next_action(PAGES[sessions.page[user_idx]])]
+        
+        # NextSong인 경우 지능적으로 노래 선택
+        song_row = -1
+        if next_page == NEXT_SONG:
+            song_row = self._select_song(*self.users.song_preferences(user_idx))
+            sessions.song[user_idx] = song_row
+            sessions.played[user_idx] += 1
+        
+        record = (int(now_ts * 1000), int(sessions.session_id[user_idx]), next_page, item_in_session, song_row)
+        
+        # 세션 상태 업데이트
+        sessions.page[user_idx] = next_page
+        
+        # 세션 종료 조건들
+        session_elapsed = now_ts - sessions.start[user_idx]
+        should_logout = (
+            next_page == LOGOUT or 
+            session_elapsed > sessions.duration[user_idx] or
+            sessions.played[user_idx] > 50
+        )
+        
+        if should_logout:
+            sessions.close(user_idx)
         
-        # 이벤트 데이터 생성
+        return record
+    
+    def _event_dict(self, user, record):
+        """이벤트 레코드를 이벤트 dict로 변환"""
+        ts, session_id, page, item_in_session, song_row = record
         event = {
-            'ts': int(current_time.timestamp() * 1000),
+            'ts': ts,
             'userId': user['user_id'],
-            'sessionId': session['session_id'],
-            'page': next_action,
+            'sessionId': session_id,
+            'page': PAGES[page],
             'auth': 'Logged In',
-            'method': self._get_http_method(next_action),
+            'method': self._get_http_method(PAGES[page]),
             'status': 200,
             'level': user['level'],
-            'itemInSession': session['item_in_session'],
+            'itemInSession': item_in_session,
             'location': user['location'],
             'userAgent': user['user_agent'],
             'firstName': user['first_name'],
@@ -334,190 +2196,502 @@ class RealisticMusicStreamingSimulator:
             'registration': int(datetime.combine(user['registration'], datetime.min.time()).timestamp()) * 1000
         }
         
-        # NextSong인 경우 지능적으로 노래 선택
-        if next_action == 'NextSong':
-            selected_song = self._select_song_intelligently(user)
-            session['current_song'] = selected_song
-            session['songs_played'].append(selected_song['song_id'])
-            
+        if song_row >= 0:
+            songs = self.songs
             event.update({
-                'artist': selected_song['artist'],
-                'song': selected_song['title'],
-                'length': selected_song['duration'],
-                'artist_tier': selected_song['artist_tier'],
-                'song_popularity': selected_song['popularity']
+                'artist': songs.artist_names[songs.artist[song_row]],
+                'song': songs.titles[songs.title[song_row]],
+                'length': int(songs.duration[song_row]),
+                'artist_tier': ARTIST_TIERS[songs.tier[song_row]],
+                'song_popularity': int(songs.popularity[song_row])
             })
         
-        # 세션 상태 업데이트
-        session['current_page'] = next_action
-        
-        # 세션 종료 조건들
-        session_elapsed = (current_time - session['session_start']).total_seconds()
-        should_logout = (
-            next_action == 'Logout' or 
-            session_elapsed > session['session_duration'] or
-            len(session['songs_played']) > 50
-        )
-        
-        if should_logout:
-            del self.user_sessions[user['user_id']]
-        
         return event
     
+    def _generate_event(self, user, session_id, current_time, next_action=None):
+        """단일 이벤트 생성 (next_action이 없으면 상태 기계에서 직접 추첨)"""
+        next_page = PAGE_CODES[next_action] if next_action is not None else None
+        record = self._advance_session(self._user_position_map()[user['user_id']], session_id,
+                                       current_time, next_page)
+        return self._event_dict(user, record)
+    
     def _get_http_method(self, action):
         """액션에 따른 HTTP 메소드 결정"""
-        method_map = {
-            'Thumbs Up': 'PUT', 'Thumbs Down': 'PUT', 'Add to Playlist': 'PUT',
-            'Settings': 'GET', 'Search': 'GET', 'Browse': 'GET', 'NextSong': 'PUT',
-            'Home': 'GET', 'Login': 'PUT', 'Register': 'PUT', 'Logout': 'PUT'
-        }
-        return method_map.get(action, 'GET')
+        return HTTP_METHODS.get(action, 'GET')
     
-    def _should_generate_event(self, current_time, user):
-        """사용자별, 시간대별 이벤트 생성 확률"""
-        hour = current_time.hour
-        
-        # 기본 시간대별 활동 패턴
-        hourly_activity = {
-            0: 0.05, 1: 0.02, 2: 0.01, 3: 0.01, 4: 0.01, 5: 0.03,
-            6: 0.10, 7: 0.25, 8: 0.40, 9: 0.50, 10: 0.60, 11: 0.70,
-            12: 0.80, 13: 0.75, 14: 0.70, 15: 0.75, 16: 0.85, 17: 0.90,
-            18: 0.95, 19: 1.00, 20: 0.95, 21: 0.85, 22: 0.70, 23: 0.30
-        }
-        
-        base_probability = hourly_activity.get(hour, 0.5)
+    @staticmethod
+    def _activity_probability(hour, weekend, activity_level, age_group):
+        """시간대·요일·사용자 속성별 이벤트 생성 확률"""
+        base_probability = HOURLY_ACTIVITY[hour]
         
         # 사용자 활동 수준에 따른 조정
-        if user['activity_level'] == 'high':
+        if activity_level == 'high':
             base_probability *= 1.5
-        elif user['activity_level'] == 'low':
+        elif activity_level == 'low':
             base_probability *= 0.6
         
         # 연령대별 조정
-        if user['age_group'] == 'teen':
+        if age_group == 'teen':
             if 15 <= hour <= 23:  # 오후~밤에 더 활발
                 base_probability *= 1.3
-        elif user['age_group'] == 'young_adult':
+        elif age_group == 'young_adult':
             if 18 <= hour <= 24:  # 저녁~밤에 활발
                 base_probability *= 1.2
-        elif user['age_group'] == 'adult':
+        elif age_group == 'adult':
             if 8 <= hour <= 18:  # 낮 시간대
                 base_probability *= 1.1
         
         # 주말 패턴
-        if current_time.weekday() >= 5:  # 주말
-            if user['age_group'] in ['teen', 'young_adult']:
+        if weekend:
+            if age_group in ['teen', 'young_adult']:
                 base_probability *= 1.2  # 젊은 층은 주말에 더 활발
             else:
                 base_probability *= 0.9  # 나이든 층은 주말에 조금 덜 활발
         
-        return random.random() < min(base_probability, 1.0)
+        return min(base_probability, 1.0)
+    
+    def _build_activity_table(self):
+        """(시간 × 평일/주말 × 활동 수준 × 연령대) 활동 확률 표 미리 계산"""
+        table = np.empty((24, 2, len(ACTIVITY_LEVELS), len(AGE_GROUPS)))
+        for hour in range(24):
+            for weekend in (0, 1):
+                for a, activity_level in enumerate(ACTIVITY_LEVELS):
+                    for g, age_group in enumerate(AGE_GROUPS):
+                        table[hour, weekend, a, g] = self._activity_probability(
+                            hour, weekend, activity_level, age_group)
+        return table
+    
+    def _should_generate_event(self, current_time, user):
+        """사용자별, 시간대별 이벤트 생성 확률"""
+        probability = self.activity_table[
+            current_time.hour,
+            int(current_time.weekday() >= 5),  # 주말
+            ACTIVITY_LEVELS.index(user['activity_level']),
+            AGE_GROUPS.index(user['age_group'])
+        ]
+        return random.random() < probability
+    
+    def _sample_active_users(self, current_time):
+        """현재 시각에 이벤트를 만들 사용자들을 한 번의 벡터 추첨으로 선택 (사용자 위치 배열 반환)"""
+        hour_table = self.activity_table[current_time.hour, int(current_time.weekday() >= 5)]
+        probabilities = hour_table[self.user_activity, self.user_age_group]
+        return np.flatnonzero(np.random.random(len(probabilities)) < probabilities)
+    
+    def _serialize_event(self, event):
+        """이벤트를 한 번만 JSON(UTF-8) bytes로 직렬화 (Kafka와 파일 출력이 같이 사용)"""
+        return json.dumps(event, ensure_ascii=False).encode('utf-8')
     
     def _write_event(self, event):
         """이벤트를 Kafka 또는 JSON 파일로 출력"""
+        payload = self._serialize_event(event)
+        value = encode_binary_event(event) if self.kafka_encoder else payload
+        self._write_payload(str(event['userId']).encode('utf-8'), payload, value)
+        return event
+    
+    def _write_payload(self, key, payload, value):
+        """직렬화된 이벤트를 Kafka(value) 또는 JSON 파일(payload)로 출력"""
+        # 파이프라인 모드에서는 싱크 스레드들에 넘김
+        if self.pipeline:
+            self.pipeline.write(key, payload, value)
+            return
+        
         # Kafka로 전송
-        if self.producer:
-            self.producer.send(
-                self.topic_name,
-                key=str(event['userId']),
-                value=event
-            )
+        if self.kafka_sink:
+            self.kafka_sink.send(key, value)
         
         # JSON 파일로 저장
-        if self.json_output:
-            json.dump(event, self.json_output, ensure_ascii=False)
-            self.json_output.write('\n')
-            self.json_output.flush()
+        if self.file_sink:
+            self.file_sink.write(payload)
+    
+    def _emit_record(self, user_idx, record, active_count):
+        """이벤트 레코드 인코딩·출력 및 샘플·진행 상황 로깅"""
+        if self.kafka_encoder:
+            # Kafka는 바이너리, 파일은 JSON (파일 출력이 없으면 JSON 인코딩 생략)
+            key, value = self.kafka_encoder.encode(user_idx, record)
+            payload = self.encoder.encode(user_idx, record)[1] if self.file_sink else None
+            self._write_payload(key, payload, value)
+        elif self.kafka_sink or self.file_sink:
+            key, payload = self.encoder.encode(user_idx, record)
+            self._write_payload(key, payload, payload)
         
-        return event
+        if self.parquet_sink:
+            self.parquet_sink.add(user_idx, record)
+        
+        self.event_count += 1
+        
+        if self.aggregator:
+            self.aggregator.add(user_idx, record)
+        
+        # 처음 3개 이벤트만 콘솔에 출력
+        if self.sample_shown < 3:
+            event = self._event_dict(self.users[user_idx], record)
+            print(json.dumps(event, indent=2, ensure_ascii=False))
+            print("---")
+            self.sample_shown += 1
+        
+        if self.event_count % 500 == 0:
+            print(f"{self.log_prefix}📊 전송된 이벤트: {self.event_count:,}")
+            print(f"{self.log_prefix}🎧 현재 활성 사용자: {active_count:,}명")
+            if self.kafka_sink:
+                print(f"{self.log_prefix}📡 {self.kafka_sink.stats_line()}")
+    
+    def _maybe_checkpoint(self):
+        """루프 반복마다 호출: 모인 이벤트를 싱크로 넘기고, 파일 출력 주기적 flush와
+        세션 상태 주기적 체크포인트 (비정상 종료 후 재개용)"""
+        if self.pipeline:
+            self.pipeline.flush()
+        elif self.file_sink:
+            self.file_sink.poll()
+        if self.snapshot_path and time.monotonic() - self.last_checkpoint >= SNAPSHOT_INTERVAL_SECONDS:
+            self._save_session_snapshot()
+            self.last_checkpoint = time.monotonic()
+    
+    def _run_tick_loop(self, end_time, continuous):
+        """틱마다 전체 사용자를 확인하는 기본 루프"""
+        while True:
+            current_time = self.clock.now()
+            
+            # 종료 조건 확인
+            if not continuous and end_time and current_time >= end_time:
+                break
+            
+            # 현재 시간에 활성화될 사용자들 선택
+            active_users = self._sample_active_users(current_time)
+            
+            # 이번 틱에 이벤트를 만들 사용자와 세션 ID 결정
+            emitters = []
+            current_pages = []
+            for user_idx, page in zip(active_users.tolist(), self.sessions.pages(active_users).tolist()):
+                # 새 세션이 필요한 경우
+                if page < 0:
+                    if random.random() < 0.1:  # 10% 확률로 새 세션 시작
+                        self.session_counter += self.session_step
+                
+                if page >= 0 or random.random() < 0.1:
+                    emitters.append((user_idx, self.session_counter))
+                    current_pages.append(page if page >= 0 else HOME)
+            
+            # 활성 세션들의 다음 페이지를 한 번에 추첨
+            next_pages = self._step_sessions(np.array(current_pages, dtype=np.intp)).tolist()
+            
+            # 활성 사용자들 이벤트 생성
+            for (user_idx, session_id), next_page in zip(emitters, next_pages):
+                # 목표 속도 모드에서는 이벤트마다 토큰을 받고, 기다린 사이 종료 시각이 지났으면 중단
+                if self.pacer and self.pacer.acquire() and self._past_end(end_time, continuous):
+                    break
+                record = self._advance_session(user_idx, session_id, current_time, next_page)
+                self._emit_record(user_idx, record, len(active_users))
+            
+            self._maybe_checkpoint()
+            
+            # 실제적인 간격 (목표 속도 모드에서는 토큰 버킷이 틱 간격을 정함)
+            if self.pacer is None or self.clock.simulated:
+                self.clock.sleep(random.uniform(0.1, 1.0))
+    
+    def _past_end(self, end_time, continuous):
+        """종료 시각이 지났는지 (목표 속도 모드에서 잠든 뒤 다시 확인)"""
+        return not continuous and end_time is not None and self.clock.now() >= end_time
+    
+    def _next_session_time(self, user_idx, after_ts):
+        """다음 세션 시작 시각 (시간대별 활동 확률을 강도로 하는 비균질 포아송 과정, thinning)"""
+        activity = self.user_activity[user_idx]
+        age_group = self.user_age_group[user_idx]
+        candidate_ts = after_ts
+        while True:
+            # 최대 강도(확률 1.0) 기준으로 후보 시각을 뽑고 그 시각의 활동 확률로 채택
+            candidate_ts += random.expovariate(1.0 / SESSION_GAP_SECONDS)
+            candidate = datetime.fromtimestamp(candidate_ts)
+            probability = self.activity_table[candidate.hour, int(candidate.weekday() >= 5), activity, age_group]
+            if random.random() < probability:
+                return candidate_ts
+    
+    def _next_event_delay(self, record):
+        """세션 안에서 다음 이벤트까지의 대기 시간 (NextSong은 곡 길이만큼 재생)"""
+        song_row = record[4]
+        if song_row >= 0:
+            return int(self.songs.duration[song_row])
+        return random.uniform(*THINK_TIME_SECONDS)
+    
+    def _run_scheduler_loop(self, end_time, continuous):
+        """사용자별 다음 이벤트 시각을 힙에 두고 시각이 도래한 사용자만 처리하는 루프"""
+        now_ts = self.clock.time()
+        schedule = []
+        for user_idx in range(len(self.users)):
+            # 이어서 진행하는 세션은 바로, 나머지는 다음 세션 시작 시각에
+            if self.sessions.is_open(user_idx):
+                schedule.append((now_ts + random.uniform(*THINK_TIME_SECONDS), user_idx))
+            else:
+                schedule.append((self._next_session_time(user_idx, now_ts), user_idx))
+        heapq.heapify(schedule)
+        
+        while schedule:
+            now_ts = self.clock.time()
+            
+            # 종료 조건 확인
+            if not continuous and end_time and now_ts >= end_time.timestamp():
+                break
+            
+            # 시각이 도래한 사용자들 꺼내기
+            due = []
+            while schedule and schedule[0][0] <= now_ts:
+                due.append(heapq.heappop(schedule))
+            
+            due_users = np.array([user_idx for _, user_idx in due], dtype=np.intp)
+            current_pages = self.sessions.pages(due_users).astype(np.intp)
+            current_pages[current_pages < 0] = HOME
+            next_pages = self._step_sessions(current_pages).tolist()
+            
+            for (due_ts, user_idx), next_page in zip(due, next_pages):
+                if self.pacer and self.pacer.acquire() and self._past_end(end_time, continuous):
+                    break
+                # 쉬고 있던 사용자는 새 세션 시작
+                if not self.sessions.is_open(user_idx):
+                    self.session_counter += self.session_step
+                
+                record = self._advance_session(user_idx, self.session_counter, datetime.fromtimestamp(due_ts),
+                                               next_page)
+                self._emit_record(user_idx, record, self.sessions.open_sessions)
+                
+                # 세션이 이어지면 생각/재생 시간 뒤에, 끝났으면 다음 세션 시작 시각에 다시 예약
+                if self.sessions.is_open(user_idx):
+                    next_ts = due_ts + self._next_event_delay(record)
+                else:
+                    next_ts = self._next_session_time(user_idx, due_ts)
+                heapq.heappush(schedule, (next_ts, user_idx))
+            
+            self._maybe_checkpoint()
+            
+            # 다음 예약 시각까지 대기
+            if schedule:
+                self.clock.wait_until(schedule[0][0])
     
-    def start_streaming(self, duration_minutes=None, continuous=False):
-        """대규모 현실적 스트리밍 시작"""
+    def start_streaming(self, duration_minutes=None, continuous=False, mode='tick',
+                        backfill_start=None, backfill_end=None, events_per_second=None,
+                        queue_depth=DEFAULT_QUEUE_DEPTH):
+        """대규모 현실적 스트리밍 시작 (backfill_start가 있으면 가상 시계로 대기 없이 과거 구간 생성)"""
         print("\n🎵 대규모 현실적 음악 스트리밍 시뮬레이터 시작")
         print(f"📊 데이터베이스 규모:")
         print(f"   - 아티스트: {len(self.artists):,}명")
         print(f"   - 곡: {len(self.songs):,}곡")
         print(f"   - 사용자: {len(self.users):,}명")
         
-        if self.producer:
+        if self.kafka_sink:
             print(f"📡 Kafka 브로커: {self.kafka_brokers}")
             print(f"📻 토픽: {self.topic_name}")
+            if self.kafka_encoder:
+                print(f"📦 Kafka 메시지 인코딩: 바이너리 (스키마 v{EVENT_SCHEMA_VERSION})")
         
         if self.output_file:
             print(f"📄 JSON 출력 파일: {self.output_file}")
         
-        if continuous:
+        if self.parquet_sink:
+            print(f"🧱 Parquet 출력: {self.parquet_sink.directory} "
+                  f"(배치 {self.parquet_sink.batch_size:,}행, 날짜·시간 파티션, {self.parquet_sink.compression or '압축 없음'})")
+        
+        if mode == 'scheduler':
+            print("🗓️  스케줄러 모드 (다음 이벤트 시각이 된 사용자만 처리)")
+        
+        self.pacer = None
+        if events_per_second:
+            self.pacer = RatePacer(events_per_second, self.log_prefix)
+            print(f"🎯 목표 속도: 초당 {events_per_second:,}개 이벤트")
+        
+        if backfill_start:
+            self.clock = SimulatedClock(backfill_start)
+            print(f"⏪ 백필 모드: {backfill_start} ~ {backfill_end} (가상 시계, 대기 없음)")
+        elif continuous:
             print("🔄 연속 모드 (Ctrl+C로 중지)")
         elif duration_minutes:
             print(f"⏱️  {duration_minutes}분 동안 실행")
         
+        # 싱크별 스레드와 크기 제한 큐 (queue_depth가 0이면 생성 스레드에서 바로 기록)
+        self.pipeline = None
+        if queue_depth and (self.kafka_sink or self.file_sink):
+            self.pipeline = SinkPipeline(self.kafka_sink, self.file_sink, queue_depth)
+            print(f"🧵 싱크 파이프라인: 싱크별 큐 {queue_depth}개 배치(배치당 최대 {PIPELINE_BATCH_SIZE}개 이벤트)")
+        
+        self.aggregator = None
+        if self.aggregate_window:
+            self.aggregator = StreamAggregator(self.users, self.songs, self.aggregate_window,
+                                               self.aggregate_output, self.log_prefix)
+            print(f"{self.log_prefix}🧮 스트리밍 집계: {self.aggregate_window:g}초 윈도 요약 → "
+                  f"{self.aggregate_output or '콘솔'}")
+        
+        self.metrics = None
+        if self.metrics_port:
+            try:
+                self.metrics = ProducerMetrics(self, self.metrics_port)
+                print(f"{self.log_prefix}📈 메트릭: http://0.0.0.0:{self.metrics_port}/metrics")
+            except OSError as e:
+                print(f"{self.log_prefix}⚠️  메트릭 포트 {self.metrics_port}를 열 수 없어 메트릭 없이 진행: {e}")
+        
         print("\n--- 샘플 이벤트 (첫 3개) ---")
         
-        start_time = datetime.now()
-        end_time = start_time + timedelta(minutes=duration_minutes) if duration_minutes else None
-        event_count = 0
-        session_id = 1
-        sample_shown = 0
+        start_time = self.clock.now()
+        # 복원한 세션 중 시작 시각보다 미래에 시작한 세션은 이어갈 수 없으므로 버림
+        dropped = self.sessions.drop_started_after(start_time.timestamp())
+        if dropped:
+            print(f"{self.log_prefix}⏮️  시작 시각 이후에 시작된 체크포인트 세션 {dropped:,}개 종료")
+        if backfill_end:
+            end_time = backfill_end
+        else:
+            end_time = start_time + timedelta(minutes=duration_minutes) if duration_minutes else None
+        self.event_count = 0
+        self.sample_shown = 0
+        self.last_checkpoint = time.monotonic()
         
         try:
-            while True:
-                current_time = datetime.now()
-                
-                # 종료 조건 확인
-                if not continuous and end_time and current_time >= end_time:
-                    break
-                
-                # 현재 시간에 활성화될 사용자들 선택
-                active_users = []
-                for user in self.users:
-                    if self._should_generate_event(current_time, user):
-                        active_users.append(user)
-                
-                # 활성 사용자들 이벤트 생성
-                for user in active_users:
-                    # 새 세션이 필요한 경우
-                    if user['user_id'] not in self.user_sessions:
-                        if random.random() < 0.1:  # 10% 확률로 새 세션 시작
-                            session_id += 1
-                    
-                    if user['user_id'] in self.user_sessions or random.random() < 0.1:
-                        event = self._generate_event(user, session_id, current_time)
-                        self._write_event(event)
-                        
-                        event_count += 1
-                        
-                        # 처음 3개 이벤트만 콘솔에 출력
-                        if sample_shown < 3:
-                            print(json.dumps(event, indent=2, ensure_ascii=False))
-                            print("---")
-                            sample_shown += 1
-                        
-                        if event_count % 500 == 0:
-                            print(f"📊 전송된 이벤트: {event_count:,}")
-                            print(f"🎧 현재 활성 사용자: {len(active_users):,}명")
-                
-                # 실제적인 간격
-                time.sleep(random.uniform(0.1, 1.0))
+            if mode == 'scheduler':
+                self._run_scheduler_loop(end_time, continuous)
+            else:
+                self._run_tick_loop(end_time, continuous)
                 
         except KeyboardInterrupt:
             print("\n🛑 사용자가 중지했습니다.")
         
         finally:
+            if self.metrics:
+                self.metrics.close()
+            
+            # 진행 중이던 집계 윈도를 부분 윈도로 내보내기
+            if self.aggregator:
+                self.aggregator.close()
+            
+            # 싱크 큐에 남은 이벤트를 모두 기록한 뒤 싱크 닫기
+            if self.pipeline:
+                self.pipeline.close()
+            
             # Kafka 프로듀서가 있으면 최대 10초만 대기 후 강제 종료
-            if self.producer:
-                try:
-                    self.producer.flush(timeout=10)      # 최대 10초만 대기
-                except Exception:
-                    pass
-                finally:
-                    self.producer.close(timeout=0)       # 즉시 닫기
+            if self.kafka_sink:
+                self.kafka_sink.close(timeout=10)
+                print(f"{self.log_prefix}📡 {self.kafka_sink.stats_line()}")
+
+            # JSON 출력 파일 닫기 (남은 버퍼 기록)
+            if self.file_sink:
+                self.file_sink.close()
+            if self.parquet_sink:
+                self.parquet_sink.close()
+            
+            # 마지막 세션 상태 저장 (다음 실행에서 이어서 진행)
+            if self.snapshot_path:
+                self._save_session_snapshot()
+            print(f"{self.log_prefix}✅ 총 {self.event_count:,}개 이벤트 처리 완료")
+            if self.pacer:
+                self.pacer.summary()
+            if self.pipeline and self.pipeline.blocked_seconds >= 0.1:
+                print(f"{self.log_prefix}🧵 싱크 큐가 가득 차서 생성이 멈춘 시간: {self.pipeline.blocked_seconds:,.1f}s")
+            if self.file_sink:
+                print(f"📁 JSON 파일 저장 완료: {self.file_sink.describe()} "
+                      f"({self.file_sink.bytes_written / 1024 / 1024:,.1f}MB, 압축 전)")
+            if self.parquet_sink:
+                print(f"{self.log_prefix}🧱 Parquet 저장 완료: {self.parquet_sink.describe()}")
+
+
+def user_partition(user_id, num_partitions):
+    """Kafka 기본 파티셔너와 같은 방식으로 userId 키의 파티션 계산"""
+    return (murmur2(str(user_id).encode('utf-8')) & 0x7fffffff) % num_partitions
+
+
+def _topic_partition_count(brokers, topic):
+    """토픽의 파티션 수 조회 (브로커가 없거나 조회에 실패하면 기본값)"""
+    if not (brokers and topic):
+        return DEFAULT_PARTITIONS
+    producer = KafkaProducer(bootstrap_servers=brokers)
+    try:
+        partitions = producer.partitions_for(topic)
+    finally:
+        producer.close(timeout=0)
+    if not partitions:
+        print(f"⚠️  토픽 {topic}의 파티션 정보를 찾지 못해 기본값 {DEFAULT_PARTITIONS}개로 샤딩합니다.")
+        return DEFAULT_PARTITIONS
+    return len(partitions)
+
 
-            # JSON 출력 파일 닫기
-            if self.json_output:
-                self.json_output.close()
-            print(f"✅ 총 {event_count:,}개 이벤트 처리 완료")
-            if self.output_file:
-                print(f"📁 JSON 파일 저장 완료: {self.output_file}")
+def _worker_output_file(output_file, worker_index):
+    """워커별 JSON 출력 파일 경로 (예: out.json -> out-w0.json)"""
+    if not output_file:
+        return None
+    stem, ext = os.path.splitext(output_file)
+    return f"{stem}-w{worker_index}{ext}"
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _run_worker(worker, simulator_options, streaming_options):
+    """워커 프로세스 본문: 공유 스냅샷을 열고 자기 샤드의 사용자만 시뮬레이션"""
+    # Ctrl+C는 부모가 받아 SIGTERM으로 전달하므로, 정리 도중 두 번 중단되지 않게 SIGINT는 무시
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    
+    options = dict(simulator_options, worker=worker,
+                   output_file=_worker_output_file(simulator_options['output_file'], worker[0]))
+    # Parquet 파티션 디렉터리는 같이 쓰고 파일 이름에 워커 번호를 붙임 (part-w0-00000.parquet)
+    if simulator_options.get('parquet_dir'):
+        options['parquet_options'] = dict(simulator_options.get('parquet_options') or {}, prefix=f'part-w{worker[0]}')
+    if simulator_options.get('aggregate_output'):
+        options['aggregate_output'] = _worker_output_file(simulator_options['aggregate_output'], worker[0])
+    # 워커마다 메트릭 포트를 하나씩 띄워 사용 (기본 포트 + 워커 번호)
+    if simulator_options.get('metrics_port'):
+        options['metrics_port'] = simulator_options['metrics_port'] + worker[0]
+    simulator = RealisticMusicStreamingSimulator(**options)
+    simulator.start_streaming(**streaming_options)
+
+
+def run_workers(num_workers, simulator_options, streaming_options):
+    """사용자를 Kafka 파티션 기준으로 나눠 워커 프로세스 여러 개로 생성
+
+    곡 카탈로그는 스냅샷 디렉터리(없으면 임시 디렉터리)에 한 번 저장하고 각 워커가
+    메모리 매핑으로 열기 때문에, 워커 수만큼 복제되지 않고 페이지 캐시를 공유한다.
+    """
+    num_partitions = _topic_partition_count(simulator_options['kafka_brokers'], simulator_options['topic_name'])
+    print(f"🧩 워커 {num_workers}개, 파티션 {num_partitions}개 기준으로 사용자 샤딩")
+    
+    temp_dir = None
+    if not simulator_options['snapshot_dir']:
+        temp_dir = tempfile.mkdtemp(prefix='music-world-')
+        simulator_options = dict(simulator_options, snapshot_dir=temp_dir)
+    
+    # 워커들이 공유할 월드를 한 번만 생성 (이미 있으면 그대로 사용)
+    RealisticMusicStreamingSimulator(
+        num_users=simulator_options['num_users'],
+        seed=simulator_options['seed'],
+        snapshot_dir=simulator_options['snapshot_dir'],
+        reference_date=simulator_options['reference_date'],
+        catalog_scale=simulator_options.get('catalog_scale', 1.0)
+    )
+    
+    if streaming_options.get('events_per_second'):
+        streaming_options = dict(streaming_options,
+                                 events_per_second=max(1, streaming_options['events_per_second'] // num_workers))
+    
+    processes = [
+        multiprocessing.Process(
+            target=_run_worker,
+            args=((worker_index, num_workers, num_partitions), simulator_options, streaming_options),
+            name=f'music-worker-{worker_index}'
+        )
+        for worker_index in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+    
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n🛑 사용자가 중지했습니다. 워커 종료 대기 중...")
+        # 워커들이 출력을 마무리하는 동안 추가 Ctrl+C로 대기가 끊기지 않게 함
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
 
 
 def main():
@@ -528,11 +2702,37 @@ def main():
                        help='Kafka 브로커 주소들 (쉼표로 구분)')
     parser.add_argument('--topic', 
                        help='Kafka 토픽 이름')
+    parser.add_argument('--linger-ms', type=int, default=20,
+                       help='배치를 모으기 위해 기다리는 최대 시간 (ms, 기본값: 20)')
+    parser.add_argument('--batch-size', type=int, default=256 * 1024,
+                       help='파티션별 배치 크기 (bytes, 기본값: 262144)')
+    parser.add_argument('--compression', choices=['none', 'gzip', 'snappy', 'lz4', 'zstd'], default='none',
+                       help='메시지 압축 방식 (기본값: none)')
+    parser.add_argument('--acks', choices=['0', '1', 'all'], default='1',
+                       help='브로커 확인 수준 (기본값: 1)')
+    parser.add_argument('--max-in-flight', type=int, default=KAFKA_MAX_IN_FLIGHT,
+                       help='응답을 기다리는 메시지 수 상한, 넘으면 생성 속도를 늦춤 (기본값: 16384, 프로듀서 버퍼 32MB 기준)')
     
     # 출력 설정
     parser.add_argument('--output', '-o',
                        help='JSON 출력 파일 경로')
     
+    parser.add_argument('--flush-interval', type=float, default=1.0,
+                       help='JSON 파일 버퍼를 기록하는 주기 (초, 비정상 종료 시 최대 손실 구간, 기본값: 1.0)')
+    parser.add_argument('--rotate-mb', type=float,
+                       help='JSON 파일이 이 크기(MB, 디스크 기준)를 넘으면 새 파일로 회전')
+    parser.add_argument('--rotate-minutes', type=float,
+                       help='JSON 파일을 이 시간(분)마다 새 파일로 회전')
+    parser.add_argument('--file-compression', choices=['none', 'gzip', 'zstd'], default='none',
+                       help='JSON 파일 스트리밍 압축 (zstd는 zstandard 패키지 필요, 기본값: none)')
+    parser.add_argument('--parquet-dir', metavar='DIR',
+                       help='이벤트를 날짜·시간 파티션(date=.../hour=...)별 Parquet 파일로 저장할 디렉터리 '
+                            '(pyarrow 필요, --output과 함께 사용 가능)')
+    parser.add_argument('--parquet-batch-size', type=int, default=PARQUET_BATCH_SIZE,
+                       help=f'Parquet 열 배치(row group) 크기, 메모리 사용량의 상한 (기본값: {PARQUET_BATCH_SIZE})')
+    parser.add_argument('--parquet-compression', choices=['none', 'zstd', 'snappy', 'gzip'], default='zstd',
+                       help='Parquet 압축 방식 (기본값: zstd)')
+    
     # 시뮬레이션 설정
     parser.add_argument('--users', type=int, default=1000,
                        help='시뮬레이션할 사용자 수 (기본값: 1000)')
@@ -540,6 +2740,35 @@ def main():
                        help='실행 시간 (분)')
     parser.add_argument('--continuous', action='store_true',
                        help='연속 실행 모드')
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                       help='백필 시작 시각 (예: 2024-01-01T00:00, 가상 시계로 대기 없이 생성)')
+    parser.add_argument('--end', type=datetime.fromisoformat,
+                       help='백필 종료 시각 (없으면 --start + --duration)')
+    parser.add_argument('--mode', choices=['tick', 'scheduler'], default='tick',
+                       help='tick: 틱마다 전체 사용자 확인 (기본값), scheduler: 다음 이벤트 시각이 된 사용자만 처리')
+    parser.add_argument('--events-per-second', type=int,
+                       help='목표 초당 이벤트 수 (토큰 버킷으로 틱 간격을 조절하고 달성 속도 보고)')
+    parser.add_argument('--queue-depth', type=int, default=DEFAULT_QUEUE_DEPTH,
+                       help=f'싱크(Kafka, 파일)별 큐에 쌓을 수 있는 배치 수, 가득 차면 생성이 멈춤 '
+                            f'(0이면 생성 스레드에서 바로 기록, 기본값: {DEFAULT_QUEUE_DEPTH})')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='생성 워커 프로세스 수 (Kafka 파티션 기준으로 사용자를 나눔, 기본값: 1)')
+    parser.add_argument('--metrics-port', type=int,
+                       help='Prometheus 메트릭 HTTP 포트 (/metrics, 워커 모드에서는 워커마다 포트 + 워커 번호)')
+    parser.add_argument('--kafka-encoding', choices=['json', 'binary'], default='json',
+                       help='Kafka 메시지 인코딩 (binary = 버전이 붙은 고정 스키마 바이너리, '
+                            'decode_events.py로 JSON 복원. 파일 출력은 항상 JSON, 기본값: json)')
+    parser.add_argument('--aggregate-window', type=float, metavar='SECONDS',
+                       help='스트리밍 집계 윈도 길이 (초, 이벤트 시각 기준). 윈도마다 페이지·티어·등급별 건수, '
+                            '고유 사용자 수, 상위 곡·아티스트를 한 줄 JSON으로 출력')
+    parser.add_argument('--aggregate-output', metavar='FILE',
+                       help='집계 요약 JSON 라인을 추가할 파일 (없으면 콘솔 출력, 워커 모드에서는 워커별 파일)')
+    parser.add_argument('--song-weighting', choices=['popularity', 'uniform'], default='popularity',
+                       help='버킷 안의 곡 선택 방식 (popularity: 인기도×재생 횟수 가중, uniform: 균등, 기본값: popularity)')
+    parser.add_argument('--seed', type=int,
+                       help='난수 시드 (같은 시드면 같은 데이터 생성)')
+    parser.add_argument('--snapshot', metavar='DIR',
+                       help='생성된 카탈로그·사용자·세션 상태를 저장/재사용할 스냅샷 디렉터리')
     
     args = parser.parse_args()
     
@@ -547,23 +2776,83 @@ def main():
     brokers = args.brokers.split(',') if args.brokers else None
     
     # 출력 방식 검증
-    if not brokers and not args.output:
-        print("❌ 오류: Kafka 브로커(--brokers) 또는 JSON 출력 파일(--output) 중 하나는 필수입니다.")
+    if not brokers and not args.output and not args.parquet_dir:
+        print("❌ 오류: Kafka 브로커(--brokers), JSON 출력 파일(--output), Parquet 디렉터리(--parquet-dir) "
+              "중 하나는 필수입니다.")
+        return
+    
+    if args.parquet_dir and pa is None:
+        print("❌ 오류: Parquet 출력에는 pyarrow 패키지가 필요합니다 (pip install pyarrow).")
+        return
+    
+    if args.file_compression == 'zstd' and zstandard is None:
+        print("❌ 오류: zstd 파일 압축에는 zstandard 패키지가 필요합니다 (pip install zstandard).")
+        return
+    
+    # 백필 구간 검증
+    backfill_end = args.end
+    if args.start and not backfill_end and args.duration:
+        backfill_end = args.start + timedelta(minutes=args.duration)
+    if args.start and not backfill_end:
+        print("❌ 오류: 백필(--start)에는 --end 또는 --duration이 필요합니다.")
+        return
+    if args.end and not args.start:
+        print("❌ 오류: --end는 --start와 함께 사용해야 합니다.")
+        return
+    if args.start and backfill_end <= args.start:
+        print("❌ 오류: --end는 --start보다 뒤여야 합니다.")
         return
     
     print("🚀 대규모 음악 스트리밍 시뮬레이터 초기화 중...")
     
-    simulator = RealisticMusicStreamingSimulator(
+    simulator_options = dict(
         kafka_brokers=brokers,
         topic_name=args.topic,
         num_users=args.users,
-        output_file=args.output
+        output_file=args.output,
+        seed=args.seed,
+        snapshot_dir=args.snapshot,
+        reference_date=args.start.date() if args.start else None,
+        metrics_port=args.metrics_port,
+        song_weighting=args.song_weighting,
+        aggregate_window=args.aggregate_window,
+        aggregate_output=args.aggregate_output,
+        kafka_encoding=args.kafka_encoding,
+        kafka_options=dict(
+            linger_ms=args.linger_ms,
+            batch_size=args.batch_size,
+            compression=None if args.compression == 'none' else args.compression,
+            acks='all' if args.acks == 'all' else int(args.acks),
+            max_in_flight=args.max_in_flight
+        ),
+        parquet_dir=args.parquet_dir,
+        parquet_options=dict(
+            batch_size=args.parquet_batch_size,
+            compression=None if args.parquet_compression == 'none' else args.parquet_compression
+        ),
+        file_options=dict(
+            flush_interval=args.flush_interval,
+            rotate_bytes=int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None,
+            rotate_seconds=args.rotate_minutes * 60 if args.rotate_minutes else None,
+            compression=None if args.file_compression == 'none' else args.file_compression
+        )
     )
-    
-    simulator.start_streaming(
+    streaming_options = dict(
         duration_minutes=args.duration,
-        continuous=args.continuous
+        continuous=args.continuous,
+        mode=args.mode,
+        backfill_start=args.start,
+        backfill_end=backfill_end,
+        events_per_second=args.events_per_second,
+        queue_depth=args.queue_depth
     )
+    
+    if args.workers > 1:
+        run_workers(args.workers, simulator_options, streaming_options)
+        return
+    
+    simulator = RealisticMusicStreamingSimulator(**simulator_options)
+    simulator.start_streaming(**streaming_options)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,239 @@
+# replay_events.py
+"""기록된 이벤트 로그(NDJSON) 재생기
+
+시뮬레이터가 남긴 JSON 라인 파일(회전·압축 파일 포함)을 Kafka 토픽으로 다시 보낸다.
+파일은 통째로 읽지 않고 mmap(압축 파일은 스트리밍 해제)으로 한 줄씩 읽으며,
+원본 ts 간격을 배속에 맞춰 유지하거나(--speed 1, 10, ...) 최대 속도(--speed max)로 보낸다.
+이벤트는 파싱·재직렬화하지 않고 원본 bytes 그대로 보내며, ts와 userId만 바이트 단위로 찾는다.
+"""
+import argparse
+import gzip
+import io
+import mmap
+import os
+import re
+import time
+from datetime import datetime
+
+from music_streaming_producer_realistic import (
+    KAFKA_MAX_IN_FLIGHT, RATE_REPORT_INTERVAL_SECONDS, FileSink, KafkaSink, zstandard
+)
+
+TS_PATTERN = re.compile(rb'"ts":\s*(\d+)')
+USER_ID_PATTERN = re.compile(rb'"userId":\s*(\d+)')
+
+# 이보다 짧게 앞서 있으면 잠들지 않음 (sleep 호출 비용이 더 큼)
+MIN_SLEEP_SECONDS = 0.001
+
+
+def read_lines(path):
+    """파일의 줄들을 bytes로 하나씩 반환 (일반 파일은 mmap, .gz/.zst는 스트리밍 해제)"""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            yield from _strip_lines(f)
+    elif path.endswith('.zst'):
+        with open(path, 'rb') as raw:
+            reader = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw), 1 << 20)
+            yield from _strip_lines(reader)
+    else:
+        if os.path.getsize(path) == 0:
+            return
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            size = len(data)
+            while start < size:
+                end = data.find(b'\n', start)
+                if end < 0:
+                    end = size
+                line = data[start:end].rstrip(b'\r')
+                if line:
+                    yield line
+                start = end + 1
+
+
+def _strip_lines(stream):
+    for line in stream:
+        line = line.rstrip(b'\r\n')
+        if line:
+            yield line
+
+
+class EventReplayer:
+    """로그 줄을 원본 ts 간격(배속 적용) 또는 최대 속도로 싱크에 전송"""
+
+    def __init__(self, kafka_sink=None, file_sink=None, speed=1.0, rewrite_ts=False):
+        self.kafka_sink = kafka_sink
+        self.file_sink = file_sink
+        self.speed = speed  # None이면 최대 속도
+        self.rewrite_ts = rewrite_ts
+
+        self.event_count = 0
+        self.first_ts = None  # 원본 로그의 첫 ts (재생 시각의 기준점)
+        self.last_ts = None
+        self.started = None
+
+    def replay(self, lines):
+        """줄 iterable을 끝까지 재생"""
+        kafka_sink = self.kafka_sink
+        file_sink = self.file_sink
+        paced = self.speed is not None
+        need_ts = paced or self.rewrite_ts
+        if self.started is None:
+            self.started = time.monotonic()
+            self.started_ms = int(time.time() * 1000)
+            self.last_report = self.started
+            self.last_report_count = 0
+
+        for line in lines:
+            if need_ts:
+                match = TS_PATTERN.search(line)
+                if match:
+                    ts = int(match.group(1))
+                    if self.first_ts is None:
+                        self.first_ts = ts
+                    self.last_ts = ts
+                    offset_seconds = (ts - self.first_ts) / 1000 / (self.speed or 1.0)
+
+                    # 원본 간격을 배속으로 나눈 재생 시각까지 대기
+                    if paced:
+                        delay = self.started + offset_seconds - time.monotonic()
+                        if delay > MIN_SLEEP_SECONDS:
+                            time.sleep(delay)
+
+                    # ts를 재생 시작 시각 기준으로 옮기기 (간격은 배속 적용)
+                    if self.rewrite_ts:
+                        start, end = match.span(1)
+                        line = b'%s%d%s' % (line[:start], self.started_ms + int(offset_seconds * 1000), line[end:])
+
+            if kafka_sink:
+                # 원래 프로듀서와 같은 키(userId)로 보내 같은 파티션에 들어가게 함
+                match = USER_ID_PATTERN.search(line)
+                kafka_sink.send(match.group(1) if match else None, line)
+            if file_sink:
+                file_sink.write(line)
+
+            self.event_count += 1
+            if self.event_count % 1000 == 0:
+                self._maybe_report()
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if now - self.last_report < RATE_REPORT_INTERVAL_SECONDS:
+            return
+        rate = (self.event_count - self.last_report_count) / (now - self.last_report)
+        print(f"📊 재생된 이벤트: {self.event_count:,} | 최근 {rate:,.0f}/s{self._position()}")
+        if self.kafka_sink:
+            print(f"📡 {self.kafka_sink.stats_line()}")
+        self.last_report = now
+        self.last_report_count = self.event_count
+
+    def _position(self):
+        """현재 재생 중인 원본 시각"""
+        if self.last_ts is None:
+            return ''
+        return f" | 원본 시각 {datetime.fromtimestamp(self.last_ts / 1000):%Y-%m-%d %H:%M:%S}"
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        rate = self.event_count / elapsed if elapsed else 0.0
+        print(f"✅ 총 {self.event_count:,}개 이벤트 재생 완료 ({elapsed:,.1f}s, 평균 {rate:,.0f}/s)")
+        if self.first_ts is not None:
+            span = (self.last_ts - self.first_ts) / 1000
+            print(f"⏱️  원본 구간 {span:,.1f}s → 재생 {elapsed:,.1f}s")
+
+
+def _speed(value):
+    """--speed 값 파싱 (max는 None = 대기 없음)"""
+    if value == 'max':
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError('배속은 0보다 커야 합니다')
+    return speed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='기록된 음악 스트리밍 이벤트 로그(NDJSON)를 Kafka로 재생')
+    parser.add_argument('inputs', nargs='+', metavar='FILE',
+                        help='재생할 JSON 라인 파일들 (지정한 순서대로 재생, .gz/.zst 지원)')
+
+    # Kafka 설정
+    parser.add_argument('--brokers',
+                        help='Kafka 브로커 주소들 (쉼표로 구분)')
+    parser.add_argument('--topic',
+                        help='Kafka 토픽 이름')
+    parser.add_argument('--linger-ms', type=int, default=20,
+                        help='배치를 모으기 위해 기다리는 최대 시간 (ms, 기본값: 20)')
+    parser.add_argument('--batch-size', type=int, default=256 * 1024,
+                        help='파티션별 배치 크기 (bytes, 기본값: 262144)')
+    parser.add_argument('--compression', choices=['none', 'gzip', 'snappy', 'lz4', 'zstd'], default='none',
+                        help='메시지 압축 방식 (기본값: none)')
+    parser.add_argument('--acks', choices=['0', '1', 'all'], default='1',
+                        help='브로커 확인 수준 (기본값: 1)')
+    parser.add_argument('--max-in-flight', type=int, default=KAFKA_MAX_IN_FLIGHT,
+                        help='응답을 기다리는 메시지 수 상한, 넘으면 읽기를 늦춤 (기본값: 16384, 프로듀서 버퍼 32MB 기준)')
+
+    # 출력 설정
+    parser.add_argument('--output', '-o',
+                        help='재생 결과를 JSON 라인 파일로도 저장 (--rewrite-ts와 함께 쓰면 시각을 옮긴 사본)')
+
+    # 재생 설정
+    parser.add_argument('--speed', type=_speed, default=1.0,
+                        help='재생 배속 (1 = 원본 간격, 10 = 10배속, max = 대기 없이 최대 속도, 기본값: 1)')
+    parser.add_argument('--rewrite-ts', action='store_true',
+                        help='ts를 재생 시작 시각 기준으로 바꿔서 전송 (간격은 배속 적용, max에서는 원본 간격 유지)')
+
+    args = parser.parse_args()
+
+    brokers = args.brokers.split(',') if args.brokers else None
+
+    if not (brokers and args.topic) and not args.output:
+        print("❌ 오류: Kafka 브로커(--brokers)와 토픽(--topic) 또는 출력 파일(--output) 중 하나는 필수입니다.")
+        return
+
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        print(f"❌ 오류: 입력 파일이 없습니다: {', '.join(missing)}")
+        return
+
+    if any(path.endswith('.zst') for path in args.inputs) and zstandard is None:
+        print("❌ 오류: .zst 파일 재생에는 zstandard 패키지가 필요합니다 (pip install zstandard).")
+        return
+
+    kafka_sink = None
+    if brokers and args.topic:
+        kafka_sink = KafkaSink(
+            brokers, args.topic,
+            linger_ms=args.linger_ms,
+            batch_size=args.batch_size,
+            compression=None if args.compression == 'none' else args.compression,
+            acks='all' if args.acks == 'all' else int(args.acks),
+            max_in_flight=args.max_in_flight
+        )
+        print(f"📡 Kafka 브로커: {brokers}")
+        print(f"📻 토픽: {args.topic}")
+
+    file_sink = FileSink(args.output) if args.output else None
+
+    replayer = EventReplayer(kafka_sink, file_sink, speed=args.speed, rewrite_ts=args.rewrite_ts)
+    print(f"⏯️  재생 속도: {'최대' if args.speed is None else f'{args.speed:g}배속'}"
+          f"{' (ts를 현재 시각 기준으로 변경)' if args.rewrite_ts else ''}")
+
+    try:
+        for path in args.inputs:
+            print(f"📄 재생 중: {path}")
+            replayer.replay(read_lines(path))
+    except KeyboardInterrupt:
+        print("\n🛑 사용자가 중지했습니다.")
+    finally:
+        if kafka_sink:
+            kafka_sink.close(timeout=10)
+            print(f"📡 {kafka_sink.stats_line()}")
+        if file_sink:
+            file_sink.close()
+            print(f"📁 JSON 파일 저장 완료: {file_sink.describe()}")
+        replayer.summary()
+
+
+if __name__ == "__main__":
+    main()